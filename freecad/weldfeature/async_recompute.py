@@ -0,0 +1,51 @@
+import concurrent.futures
+import itertools
+import FreeCAD
+from PySide import QtCore
+
+_executor = None
+_dispatcher = None
+_generation_counter = itertools.count()
+_latest_generation = {}
+
+
+class _ResultDispatcher(QtCore.QObject):
+    """Lives in the GUI thread. Results are emitted to it from worker threads,
+    and Qt queues the signal so that callbacks always run in the GUI thread"""
+
+    finished = QtCore.Signal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.finished.connect(self.deliver)
+
+    def deliver(self, job):
+        key, generation, future, on_done = job
+        if _latest_generation.get(key) != generation:
+            return  # superseded by a newer job for the same key
+        del _latest_generation[key]
+        try:
+            result = future.result()
+        except Exception as e:
+            FreeCAD.Console.PrintError(f"Background weld computation failed: {e}\n")
+            return
+        on_done(result)
+
+
+def submit(key, work, on_done):
+    """Run work() on a background thread, then call on_done(result) in the GUI
+    thread. If another job is submitted with the same key before this one
+    finishes, this job's result is silently dropped. Must be called from the
+    GUI thread"""
+    global _executor, _dispatcher
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="WeldFeature"
+        )
+        _dispatcher = _ResultDispatcher()
+    generation = next(_generation_counter)
+    _latest_generation[key] = generation
+    future = _executor.submit(work)
+    future.add_done_callback(
+        lambda f: _dispatcher.finished.emit((key, generation, f, on_done))
+    )
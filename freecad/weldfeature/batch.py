@@ -0,0 +1,286 @@
+import argparse
+import collections
+import contextlib
+import functools
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import sys
+import time
+import FreeCAD
+from .weld_report import is_weld_feature
+from .weld_report import write_report
+
+FileResult = collections.namedtuple(
+    "FileResult", ["path", "weld_count", "seconds", "error"]
+)
+
+
+@contextlib.contextmanager
+def _time_limit(seconds):
+    """Raise TimeoutError in the block if it runs for longer than seconds. Only
+    enforced where SIGALRM is available, and only from the main thread. Long
+    running OCC calls are interrupted once they return to python. This is the
+    best that can be done when files are processed in this process. Worker
+    processes are instead killed by the parent, see _run_in_workers"""
+    if not seconds or not hasattr(signal, "setitimer"):
+        yield
+        return
+
+    def on_alarm(signum, frame):
+        raise TimeoutError(f"timed out after {seconds} s")
+
+    previous_handler = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def process_file(
+    path, report_format=None, report_dir=None, save=False, output_dir=None, timeout=None
+) -> FileResult:
+    """Open a document, recompute every weld feature in it, then optionally write
+    a weld report and save the document. Errors are returned rather than raised,
+    so that one broken file doesn't stop a batch"""
+    start = time.perf_counter()
+    weld_count = 0
+    error = None
+    try:
+        with _time_limit(timeout):
+            doc = FreeCAD.openDocument(path)
+            try:
+                welds = [x for x in doc.Objects if is_weld_feature(x)]
+                weld_count = len(welds)
+                for obj in welds:
+                    obj.touch()
+                doc.recompute()
+                # a timeout raised inside a weld's execute() is caught by the
+                # recompute, which then carries on with the other objects
+                if timeout and time.perf_counter() - start > timeout:
+                    raise TimeoutError(f"timed out after {timeout} s")
+                failed = [x.Name for x in welds if "Invalid" in x.State]
+                if failed:
+                    error = f"failed to recompute {', '.join(failed)}"
+                stem = os.path.splitext(os.path.basename(path))[0]
+                if report_format is not None:
+                    report_path = os.path.join(
+                        report_dir or os.path.dirname(path),
+                        f"{stem}_welds.{report_format}",
+                    )
+                    write_report(doc, report_path)
+                if output_dir is not None:
+                    doc.saveAs(os.path.join(output_dir, os.path.basename(path)))
+                elif save:
+                    doc.save()
+            finally:
+                FreeCAD.closeDocument(doc.Name)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return FileResult(path, weld_count, time.perf_counter() - start, error)
+
+
+def _worker_loop(connection, worker):
+    connection.send("ready")
+    while True:
+        path = connection.recv()
+        if path is None:
+            break
+        connection.send(worker(path))
+
+
+class _Worker:
+    """A worker process that processes one file at a time, and that is killed
+    when a file takes too long"""
+
+    def __init__(self, context, worker):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_worker_loop, args=(child_connection, worker), daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+        self.ready = False
+        self.path = None
+        self.start = None
+        self.deadline = None
+
+    def submit(self, path, timeout):
+        if not self.ready:
+            # don't count the start up of the process against the time limit
+            self.connection.recv()
+            self.ready = True
+        self.path = path
+        self.start = time.perf_counter()
+        self.deadline = self.start + timeout if timeout else None
+        self.connection.send(path)
+
+    def receive(self):
+        result = self.connection.recv()
+        self.path = None
+        return result
+
+    def close(self):
+        """Stop the worker once it has finished its current file, or kill it if
+        it is still busy"""
+        if self.path is None:
+            with contextlib.suppress(OSError):
+                self.connection.send(None)
+            self.process.join(5.0)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+
+
+def _run_in_workers(worker, paths, workers, timeout):
+    """Yield the result of worker(path) for each path, computed in a pool of
+    worker processes. Results are yielded as they finish. When a file takes
+    longer than timeout, or its worker dies, the worker is replaced and a failed
+    FileResult is yielded for that file"""
+    # spawn rather than fork, so that workers don't inherit the state of an
+    # already initialized FreeCAD
+    context = multiprocessing.get_context("spawn")
+    pending = collections.deque(paths)
+    idle = [_Worker(context, worker) for _ in range(min(workers, len(pending)))]
+    busy = []
+    try:
+        while pending or busy:
+            failed = []
+            while pending and idle:
+                process = idle.pop()
+                path = pending.popleft()
+                try:
+                    process.submit(path, timeout)
+                except (EOFError, OSError):
+                    failed.append((process, path, 0.0, "worker process exited"))
+                else:
+                    busy.append(process)
+            if not failed:
+                deadlines = [x.deadline for x in busy if x.deadline is not None]
+                wait_seconds = None
+                if deadlines:
+                    wait_seconds = max(0.0, min(deadlines) - time.perf_counter())
+                ready = multiprocessing.connection.wait(
+                    [x.connection for x in busy], wait_seconds
+                )
+                now = time.perf_counter()
+                for process in list(busy):
+                    if process.connection in ready:
+                        busy.remove(process)
+                        try:
+                            result = process.receive()
+                        except (EOFError, OSError):
+                            error = "worker process exited"
+                        else:
+                            idle.append(process)
+                            yield result
+                            continue
+                    elif process.deadline is not None and now >= process.deadline:
+                        busy.remove(process)
+                        error = f"timed out after {timeout} s"
+                    else:
+                        continue
+                    failed.append((process, process.path, now - process.start, error))
+            # hung or dead workers are replaced before any result is reported
+            for process, *_ in failed:
+                process.kill()
+                if pending:
+                    idle.append(_Worker(context, worker))
+            for _, path, seconds, error in failed:
+                yield FileResult(path, 0, seconds, error)
+    finally:
+        for process in idle + busy:
+            process.close()
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m freecad.weldfeature.batch",
+        description="Recompute the weld features of FreeCAD documents, and write "
+        "weld reports or updated documents",
+    )
+    parser.add_argument("files", nargs="+", help="FCStd files to process")
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of worker processes. With 1, files are processed in this "
+        "process, which is required when running inside FreeCADCmd "
+        "(default: the number of CPUs)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="maximum number of seconds to spend on each file. Worker processes "
+        "that exceed it are killed. With 1 worker, the limit is only checked "
+        "while python code runs, and not at all on Windows",
+    )
+    parser.add_argument(
+        "--report",
+        choices=["csv", "json"],
+        default=None,
+        help="write a weld report for each file, in this format",
+    )
+    parser.add_argument(
+        "--report-dir",
+        default=None,
+        help="directory for weld reports (default: next to each file)",
+    )
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument(
+        "--save", action="store_true", help="save recomputed documents in place"
+    )
+    output.add_argument(
+        "--output-dir", default=None, help="save recomputed documents to this directory"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    """Run the batch processor. Returns 0 if every file was processed without
+    errors, and 1 otherwise"""
+    args = _parse_args(argv)
+    worker = functools.partial(
+        process_file,
+        report_format=args.report,
+        report_dir=args.report_dir,
+        save=args.save,
+        output_dir=args.output_dir,
+    )
+    workers = max(1, min(args.workers or 1, len(args.files)))
+    start = time.perf_counter()
+    failures = 0
+    with contextlib.ExitStack() as stack:
+        if workers == 1:
+            results = map(functools.partial(worker, timeout=args.timeout), args.files)
+        else:
+            # the time limit is enforced by the parent, which can also stop long
+            # running OCC calls
+            results = _run_in_workers(worker, args.files, workers, args.timeout)
+            stack.callback(results.close)
+        for result in results:
+            status = "ok" if result.error is None else f"FAILED ({result.error})"
+            print(
+                f"{result.path}: {result.weld_count} welds, "
+                f"{result.seconds:.2f} s, {status}",
+                flush=True,
+            )
+            failures += result.error is not None
+    print(
+        f"processed {len(args.files)} files with {workers} workers in "
+        f"{time.perf_counter() - start:.2f} s, {failures} failed"
+    )
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -51,6 +51,8 @@ class AddWeldFeatureCommand:
         base_color, alternate_color = get_best_default_object_colors(obj.Base[0][0])
         obj.ViewObject.ShapeColor = base_color
         obj.ViewObject.AlternatingColor = alternate_color
+        # the weld geometry is only built when the object is recomputed
+        obj.recompute()
         # show the objects task panel
         taskpanel = WeldFeatureTaskPanel(obj, True)
         FreeCADGui.Control.showDialog(taskpanel)
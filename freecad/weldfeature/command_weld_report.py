@@ -0,0 +1,31 @@
+import os
+import FreeCAD
+import FreeCADGui
+from PySide import QtGui
+from freecad.weldfeature import ICONPATH
+from .weld_report import write_report
+
+
+class WeldReportCommand:
+    def GetResources(self):
+        return {
+            "Pixmap": os.path.join(ICONPATH, "WeldFeature.svg"),
+            "Menutext": "Weld report...",
+            "tooltip": "Export a schedule of every weld in the active document",
+        }
+
+    def Activated(self):
+        doc = FreeCAD.ActiveDocument
+        path, _ = QtGui.QFileDialog.getSaveFileName(
+            FreeCADGui.getMainWindow(),
+            "Export weld report",
+            f"{doc.Name}_welds.csv",
+            "CSV files (*.csv);;JSON files (*.json)",
+        )
+        if not path:
+            return
+        count = write_report(doc, path)
+        FreeCAD.Console.PrintMessage(f"Wrote {count} welds to {path}\n")
+
+    def IsActive(self):
+        return FreeCAD.ActiveDocument is not None
@@ -1,8 +1,17 @@
+import bisect
+import hashlib
 import math
 import FreeCAD
 import collections
 import itertools
+import numpy as np
 import Part
+from . import tracing
+from .weld_metrics import stitch_intervals
+
+# number of samples in the arc length table of an edge whose parameter isn't
+# proportional to its arc length
+ARC_LENGTH_SAMPLES = 64
 
 
 def round_vector(vec, ndigits=None):
@@ -26,9 +35,15 @@ def should_flip_edges(this_edge, next_edge, eps=1e-5):
 
 
 class CompositeEdge:
+    @tracing.traced("CompositeEdge")
     def __init__(self, list_of_edges):
         self._list_of_edges = Part.sortEdges(list_of_edges)[0]
         self._list_of_lengths = [x.Length for x in self._list_of_edges]
+        # prefix sums of the edge lengths. _cumulative_lengths[i] is the composite
+        # parameter at which edge i begins, and the final entry is the total length
+        self._cumulative_lengths = list(
+            itertools.accumulate(self._list_of_lengths, initial=0.0)
+        )
         self._should_flip_list = []
         is_first = True
         if len(self._list_of_edges) > 1:
@@ -49,60 +64,470 @@ class CompositeEdge:
                 self._should_flip_list.append(not should_flip)
         else:
             self._should_flip_list = None
+        # arc length tables are built the first time an edge is evaluated
+        self._arc_length_tables = [None] * len(self._list_of_edges)
 
     @property
     def Length(self):
-        return sum(x.Length for x in self._list_of_edges)
+        return self._cumulative_lengths[-1]
 
     def discretize(self, n):
-        points = []
         firstparam, lastparam = self.ParameterRange
-        for i in range(n):
-            points.append(self.valueAt(i / n * (lastparam - firstparam)))
-        points.append(self.valueAt(lastparam))
-        return points
+        params = [i / n * (lastparam - firstparam) for i in range(n)]
+        params.append(lastparam)
+        return self.valueAtMany(params)
 
     @property
     def ParameterRange(self):
         return (0.0, self.Length)
 
-    def valueAt(self, param):
-        if (param < self.ParameterRange[0]) or (param > self.ParameterRange[1]):
+    def _check_parameter(self, param):
+        if (param < 0.0) or (param > self.Length):
             raise ValueError(
                 f"Requested point ({param}) is outside the parameter range ({self.ParameterRange})"
             )
-        # shortcut for single edges
-        if len(self._list_of_edges) == 1:
-            e = self._list_of_edges[0]
-            return e.valueAt(
-                e.FirstParameter
-                + (e.LastParameter - e.FirstParameter) * param / e.Length
+
+    def _edge_index_at(self, param):
+        """bisect the cumulative lengths to find the edge containing param"""
+        index = bisect.bisect_left(self._cumulative_lengths, param, lo=1) - 1
+        return min(index, len(self._list_of_edges) - 1)
+
+    def _edge_parameter(self, index, param):
+        """map a composite parameter onto the native parameter of edge[index]"""
+        traverse = (param - self._cumulative_lengths[index]) / self._list_of_lengths[
+            index
+        ]
+        if self._should_flip_list is not None and self._should_flip_list[index]:
+            traverse = 1 - traverse
+        return float(self._native_parameters(index, traverse))
+
+    def _native_parameters(self, index, traverse):
+        """map fractions of the arc length of edge[index] onto its native
+        parameters. traverse may be a number or an array"""
+        table = self._arc_length_tables[index]
+        if table is None:
+            table = self._arc_length_tables[index] = arc_length_table(
+                self._list_of_edges[index]
             )
-        running_total = 0.0
-        for i in range(len(self._list_of_edges)):
-            running_total += self._list_of_edges[i].Length
-            index_of_the_edge = i
-            if param <= running_total:
-                break
-        the_edge = self._list_of_edges[index_of_the_edge]
-        firstparam, lastparam = the_edge.ParameterRange
-        e_length = the_edge.Length
-        len_of_all_previous = running_total - e_length
-        if not self._should_flip_list[index_of_the_edge]:
-            # don't flip
-            traverse = (param - len_of_all_previous) / e_length
-        else:
-            traverse = 1 - (param - len_of_all_previous) / e_length
-        value = the_edge.valueAt(firstparam + traverse * (lastparam - firstparam))
-        return value
+        return np.interp(traverse, *table)
 
+    def valueAt(self, param):
+        self._check_parameter(param)
+        index = self._edge_index_at(param)
+        return self._list_of_edges[index].valueAt(self._edge_parameter(index, param))
 
-def discretize_list_of_edges(edge_list, spacing):
+    def valueAtMany(self, params):
+        """Evaluate a sequence of composite parameters. Finding the edge and the
+        native parameter of each point is vectorized, but the points themselves
+        are still evaluated one by one with Edge.valueAt, since Part has no call
+        that evaluates an edge at many given parameters. Points are returned in
+        the order of params"""
+        params = np.asarray(params, dtype=np.float64).reshape(-1)
+        outside = (params < 0.0) | (params > self.Length)
+        if outside.any():
+            self._check_parameter(params[outside][0])
+        cumulative = np.asarray(self._cumulative_lengths)
+        # the same edge as _edge_index_at, for every parameter at once
+        indexes = np.searchsorted(cumulative[1:], params, side="left")
+        indexes = np.minimum(indexes, len(self._list_of_edges) - 1)
+        traverse = (params - cumulative[indexes]) / np.asarray(self._list_of_lengths)[
+            indexes
+        ]
+        if self._should_flip_list is not None:
+            flip = np.asarray(self._should_flip_list)[indexes]
+            traverse = np.where(flip, 1.0 - traverse, traverse)
+        points = [None] * len(params)
+        for index in np.unique(indexes).tolist():
+            the_edge = self._list_of_edges[index]
+            positions = np.flatnonzero(indexes == index)
+            edge_params = self._native_parameters(index, traverse[positions])
+            for position, param in zip(positions.tolist(), edge_params.tolist()):
+                points[position] = the_edge.valueAt(param)
+        return points
+
+
+def arc_length_table(edge):
+    """Sample the native parameter of an edge at evenly spaced fractions of its
+    arc length. Returns (fractions, parameters), to be inverted with np.interp.
+    Lines and circles are parameterized proportionally to arc length, so their
+    table is just the ends of the parameter range"""
+    firstparam, lastparam = edge.ParameterRange
+    try:
+        curve = edge.Curve
+    except TypeError:
+        # raised by FreeCAD for curve types that have no python wrapper. Those
+        # are sampled like any other curve
+        curve = None
+    if isinstance(curve, (Part.Line, Part.Circle)) or edge.Length <= 0.0:
+        return np.array([0.0, 1.0]), np.array([firstparam, lastparam])
+    fractions = np.linspace(0.0, 1.0, ARC_LENGTH_SAMPLES)
+    params = np.empty(ARC_LENGTH_SAMPLES)
+    params[0], params[-1] = firstparam, lastparam
+    for i in range(1, ARC_LENGTH_SAMPLES - 1):
+        params[i] = edge.getParameterByLength(fractions[i] * edge.Length)
+    # keep the table monotone, despite the tolerance of the length integration
+    return fractions, np.maximum.accumulate(params)
+
+
+class PolylineArray:
+    """A set of polylines, stored contiguously in CSR style: points is an (N, 3)
+    float64 array of all vertexes, and polyline i is the slice
+    points[offsets[i]:offsets[i + 1]]"""
+
+    def __init__(self, points=None, offsets=None):
+        if points is None:
+            points = np.empty((0, 3))
+        if offsets is None:
+            offsets = [0]
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_polylines(cls, polylines):
+        """build from an iterable of polylines, each of which may be an (n, 3)
+        array or a list of FreeCAD.Vector"""
+        arrays = [np.asarray(x, dtype=np.float64).reshape(-1, 3) for x in polylines]
+        offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(x) for x in arrays])
+        if not arrays:
+            return cls(None, offsets)
+        return cls(np.concatenate(arrays), offsets)
+
+    @classmethod
+    def concatenate(cls, polyline_arrays):
+        """join several PolylineArray into one, keeping every polyline separate"""
+        polyline_arrays = list(polyline_arrays)
+        if not polyline_arrays:
+            return cls()
+        offsets = [polyline_arrays[0].offsets]
+        start = polyline_arrays[0].offsets[-1]
+        for x in polyline_arrays[1:]:
+            offsets.append(x.offsets[1:] + start)
+            start += x.offsets[-1]
+        points = np.concatenate([x.points for x in polyline_arrays])
+        return cls(points, np.concatenate(offsets))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError("polyline index out of range")
+        index %= len(self)
+        return self.points[self.offsets[index] : self.offsets[index + 1]]
+
+    def __iter__(self):
+        for start, end in zip(self.offsets[:-1], self.offsets[1:]):
+            yield self.points[start:end]
+
+    @property
+    def nbytes(self) -> int:
+        return self.points.nbytes + self.offsets.nbytes
+
+    def segment_mask(self) -> np.ndarray:
+        """boolean mask over np.diff(points), true for segments that lie within a
+        single polyline rather than bridging the end of one and start of the next"""
+        mask = np.ones(max(0, len(self.points) - 1), dtype=bool)
+        boundaries = self.offsets[1:-1] - 1
+        mask[boundaries[(boundaries >= 0) & (boundaries < len(mask))]] = False
+        return mask
+
+    def segment_lengths(self) -> np.ndarray:
+        lengths = np.linalg.norm(np.diff(self.points, axis=0), axis=1)
+        return lengths[self.segment_mask()]
+
+    def length(self) -> float:
+        return float(self.segment_lengths().sum())
+
+    def to_vectors(self) -> list[list[FreeCAD.Vector]]:
+        return [[FreeCAD.Vector(*x) for x in polyline.tolist()] for polyline in self]
+
+    def fingerprint(self) -> bytes:
+        """a digest of the exact contents, to tell whether a path has changed"""
+        digest = hashlib.blake2b(self.points.tobytes(), digest_size=16)
+        digest.update(self.offsets.tobytes())
+        return digest.digest()
+
+    def decimate(self, spacing) -> "PolylineArray":
+        """a coarser copy, keeping roughly one point per spacing of length along
+        each polyline. The first and last point of every polyline are kept"""
+        decimated = []
+        for points in self:
+            if len(points) < 3:
+                decimated.append(points)
+                continue
+            steps = np.linalg.norm(np.diff(points, axis=0), axis=1)
+            bins = np.floor(np.concatenate([[0.0], np.cumsum(steps)]) / spacing)
+            keep = np.concatenate([[True], bins[1:] != bins[:-1]])
+            keep[-1] = True
+            decimated.append(points[keep])
+        return PolylineArray.from_polylines(decimated)
+
+
+def rotations_from_y_axis(directions) -> np.ndarray:
+    """(n, 3, 3) rotation matrices that turn the +Y axis onto each of an (n, 3)
+    array of directions. Zero length directions give the identity"""
+    directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+    norms = np.linalg.norm(directions, axis=1)
+    unit = np.tile([0.0, 1.0, 0.0], (len(directions), 1))
+    nonzero = norms > 0.0
+    unit[nonzero] = directions[nonzero] / norms[nonzero, np.newaxis]
+    x, y, z = unit.T
+    # Rodrigues' formula, with the axis Y x d = (z, 0, -x) and cos(angle) = y
+    skew = np.zeros((len(unit), 3, 3))
+    skew[:, 0, 1] = x
+    skew[:, 1, 0] = -x
+    skew[:, 1, 2] = -z
+    skew[:, 2, 1] = z
+    opposite = y < -1.0 + 1e-12
+    factor = np.where(opposite, 0.0, 1.0 / np.where(opposite, 1.0, 1.0 + y))
+    rotations = np.eye(3) + skew + (skew @ skew) * factor[:, np.newaxis, np.newaxis]
+    # a half turn about X for directions pointing straight down the -Y axis
+    rotations[opposite] = np.diag([1.0, -1.0, -1.0])
+    return rotations
+
+
+def coin_transform_matrices(translations, directions, scales=None) -> np.ndarray:
+    """(n, 4, 4) transformation matrices that scale, then rotate the +Y axis onto
+    directions, then translate. The matrices use the row-vector layout of
+    Coin3D's SbMatrix, so they can be uploaded to an SoMFMatrix field as-is"""
+    translations = np.asarray(translations, dtype=np.float64).reshape(-1, 3)
+    matrices = np.zeros((len(translations), 4, 4))
+    rotations = rotations_from_y_axis(directions)
+    if scales is None:
+        matrices[:, :3, :3] = rotations.transpose(0, 2, 1)
+    else:
+        scales = np.asarray(scales, dtype=np.float64).reshape(-1, 3)
+        matrices[:, :3, :3] = scales[:, :, np.newaxis] * rotations.transpose(0, 2, 1)
+    matrices[:, 3, :3] = translations
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+
+def _transported_normals(tangents: np.ndarray) -> np.ndarray:
+    """Normals for a sequence of unit segment tangents, each one the previous
+    normal with its component along the next tangent removed. This keeps the
+    frames from twisting along the path (parallel transport)"""
+    first = tangents[0]
+    # start from whichever coordinate axis is least aligned with the tangent
+    axis = np.zeros(3)
+    axis[np.argmin(np.abs(first))] = 1.0
+    normal = np.cross(first, axis)
+    normal = (normal / np.linalg.norm(normal)).tolist()
+    normals = []
+    for tx, ty, tz in tangents.tolist():
+        nx, ny, nz = normal
+        d = nx * tx + ny * ty + nz * tz
+        nx, ny, nz = nx - d * tx, ny - d * ty, nz - d * tz
+        norm = math.sqrt(nx * nx + ny * ny + nz * nz)
+        if norm < 1e-9:
+            # the path doubled back on itself, any perpendicular will do
+            axis = np.zeros(3)
+            axis[np.argmin(np.abs([tx, ty, tz]))] = 1.0
+            nx, ny, nz = np.cross([tx, ty, tz], axis).tolist()
+            norm = math.sqrt(nx * nx + ny * ny + nz * nz)
+        normal = [nx / norm, ny / norm, nz / norm]
+        normals.append(normal)
+    return np.array(normals)
+
+
+def _drop_repeated_points(points: np.ndarray) -> np.ndarray:
+    # repeated points leave zero length segments, which have no direction
+    if len(points) < 2:
+        return points
+    steps = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    return points[np.concatenate([[True], steps > 1e-9])]
+
+
+def tube_mesh(polylines: PolylineArray, radius, sides=12):
+    """Build a single tube mesh around every polyline. Returns a tuple of
+    (coordinates, normals, faces, face_parity): an (M, 3) array of vertexes, an
+    (M, 3) array of matching unit vertex normals, an (F, 4) array of vertex
+    indexes for each quad (counterclockwise seen from outside the tube) and an
+    (F,) array that is 0 or 1 for faces on even or odd segments of each polyline.
+    Adjacent segments share a ring of vertexes placed on the mitre plane
+    between them, so the tube has no overlaps or gaps at corners"""
+    angles = np.linspace(0.0, 2.0 * math.pi, sides, endpoint=False)
+    cosines = np.cos(angles)[np.newaxis, :, np.newaxis]
+    sines = np.sin(angles)[np.newaxis, :, np.newaxis]
+    coordinates, normals, faces, parity = [], [], [], []
+    vertex_count = 0
+    for points in polylines:
+        points = _drop_repeated_points(points)
+        if len(points) < 2:
+            continue
+        segments = np.diff(points, axis=0)
+        tangents = segments / np.linalg.norm(segments, axis=1)[:, np.newaxis]
+        segment_normals = _transported_normals(tangents)
+        segment_binormals = np.cross(tangents, segment_normals)
+        # each ring is built in the frame of the segment leading up to it, then
+        # projected along that segment onto the mitre plane
+        ring_frame = np.concatenate([[0], np.arange(len(segments))])
+        ring_tangents = tangents[ring_frame]
+        mitres = ring_tangents.copy()
+        mitres[1:-1] += tangents[1:]
+        mitre_norms = np.linalg.norm(mitres, axis=1)
+        # where the path doubles back on itself there is no mitre plane, so the
+        # ring is left perpendicular to the segment leading up to it
+        reversed_rings = mitre_norms < 1e-9
+        mitres[reversed_rings] = ring_tangents[reversed_rings]
+        mitre_norms[reversed_rings] = 1.0
+        mitres /= mitre_norms[:, np.newaxis]
+        offsets = radius * (
+            cosines * segment_normals[ring_frame][:, np.newaxis, :]
+            + sines * segment_binormals[ring_frame][:, np.newaxis, :]
+        )
+        # limit the stretch of the mitre at very sharp corners
+        alignment = np.maximum(np.einsum("ij,ij->i", ring_tangents, mitres), 0.2)
+        distances = np.einsum("rsk,rk->rs", offsets, mitres) / alignment[:, None]
+        offsets -= distances[:, :, np.newaxis] * ring_tangents[:, np.newaxis, :]
+        coordinates.append((points[:, np.newaxis, :] + offsets).reshape(-1, 3))
+        unit_offsets = offsets / np.linalg.norm(offsets, axis=2)[:, :, np.newaxis]
+        normals.append(unit_offsets.reshape(-1, 3))
+        # quads between ring i and ring i + 1
+        ring = np.arange(len(segments))[:, np.newaxis] * sides
+        j = np.arange(sides)[np.newaxis, :]
+        j_next = (j + 1) % sides
+        quads = np.stack(
+            [ring + j, ring + j_next, ring + sides + j_next, ring + sides + j],
+            axis=-1,
+        )
+        faces.append(quads.reshape(-1, 4) + vertex_count)
+        parity.append(np.repeat(np.arange(len(segments)) % 2, sides))
+        vertex_count += len(points) * sides
+    if not coordinates:
+        empty = np.empty((0, 3))
+        return empty, empty, np.empty((0, 4), np.int64), np.empty(0, np.int64)
+    return (
+        np.concatenate(coordinates),
+        np.concatenate(normals),
+        np.concatenate(faces),
+        np.concatenate(parity),
+    )
+
+
+def sweep_polylines(polylines: PolylineArray, radius) -> Part.Shape:
+    """Sweep a circle of the given radius along each polyline. Returns a compound
+    of the resulting solids. Polylines that can't be swept are skipped"""
+    solids = []
+    for points in polylines:
+        points = _drop_repeated_points(points)
+        if len(points) < 2:
+            continue
+        vectors = [FreeCAD.Vector(*x) for x in points.tolist()]
+        path = Part.makePolygon(vectors)
+        profile = Part.Wire(
+            Part.makeCircle(radius, vectors[0], vectors[1] - vectors[0])
+        )
+        try:
+            # solid, not frenet, with right corner transitions between segments
+            solids.append(path.makePipeShell([profile], True, False, 1))
+        except Part.OCCError as e:
+            FreeCAD.Console.PrintWarning(f"Could not sweep a weld bead: {e}\n")
+    return Part.makeCompound(solids)
+
+
+def split_point_budget(lengths, number_of_segments):
+    """Distribute a number of segments over a set of edge lengths, proportionally
+    to length (largest remainder method). Every edge with a non-zero length gets
+    at least one segment, so the result may exceed the budget for very short edges
+    """
+    total_length = sum(lengths)
+    if total_length <= 0.0:
+        return [0] * len(lengths)
+    ideal = [number_of_segments * x / total_length for x in lengths]
+    counts = [max(1, math.floor(x)) if x > 0.0 else 0 for x in ideal]
+    remainder = number_of_segments - sum(counts)
+    if remainder > 0:
+        # hand out the leftover segments to the edges that were rounded down most
+        by_shortfall = sorted(range(len(ideal)), key=lambda i: counts[i] - ideal[i])
+        for i in by_shortfall[:remainder]:
+            counts[i] += 1
+    return counts
+
+
+def discretize_edges(edge_list, spacing) -> np.ndarray:
+    """returns an (N, 3) array of points spaced roughly evenly along a set of
+    connected edges. The global point budget is split over the sorted and
+    orientation-corrected edges, and each edge is discretized in a single call
+    to OCC rather than evaluating points one at a time from python
+    """
     comp = CompositeEdge(edge_list)
     total_edge_length = comp.Length
+    if total_edge_length <= 0.0:
+        return np.empty((0, 3))
     number_to_split_into = max(2, math.floor(total_edge_length / spacing))
-    points = comp.discretize(number_to_split_into)
-    return points
+    counts = split_point_budget(comp._list_of_lengths, number_to_split_into)
+    chunks = []
+    for index, (edge, count) in enumerate(zip(comp._list_of_edges, counts)):
+        if count == 0:
+            continue  # skip degenerate edges
+        points = np.array(edge.discretize(Number=count + 1), dtype=np.float64)
+        if comp._should_flip_list is not None and comp._should_flip_list[index]:
+            points = points[::-1]
+        # the first point of each edge duplicates the last point of the previous one
+        chunks.append(points if not chunks else points[1:])
+    return np.concatenate(chunks)
+
+
+def enforce_segment_lengths(points: np.ndarray, min_length, max_length):
+    """Clean up a polyline so that every segment is between min_length and
+    max_length long (where possible). Interior points closer than min_length to
+    the previous point are dropped, and then segments longer than max_length are
+    split into equal parts. The end points are always kept"""
+    if len(points) < 2:
+        return points
+    kept = [0]
+    for i in range(1, len(points) - 1):
+        if np.linalg.norm(points[i] - points[kept[-1]]) >= min_length:
+            kept.append(i)
+    if len(kept) > 1 and np.linalg.norm(points[-1] - points[kept[-1]]) < min_length:
+        kept.pop()
+    kept.append(len(points) - 1)
+    points = points[kept]
+    segments = np.diff(points, axis=0)
+    lengths = np.linalg.norm(segments, axis=1)
+    parts = np.maximum(1, np.ceil(lengths / max_length)).astype(np.int64)
+    # for segment i, emit points[i] + segments[i] * k / parts[i] for k < parts[i]
+    segment_index = np.repeat(np.arange(len(segments)), parts)
+    k = np.arange(parts.sum()) - np.repeat(np.cumsum(parts) - parts, parts)
+    fractions = (k / parts[segment_index])[:, np.newaxis]
+    split_points = points[segment_index] + segments[segment_index] * fractions
+    return np.concatenate([split_points, points[-1:]])
+
+
+def discretize_edges_adaptive(
+    edge_list, deflection, angular_deflection, min_length, max_length
+) -> np.ndarray:
+    """returns an (N, 3) array of points along a set of connected edges, placed
+    according to the local curvature of the edges rather than at a fixed
+    spacing. deflection is the maximum distance between the chords and the
+    curve, and angular_deflection the maximum angle (in radians) between
+    consecutive chords. Segment lengths are then clamped to
+    [min_length, max_length], so straight runs get few points and tight curves
+    keep their fidelity
+    """
+    comp = CompositeEdge(edge_list)
+    chunks = []
+    for index, edge in enumerate(comp._list_of_edges):
+        if comp._list_of_lengths[index] <= 0.0:
+            continue  # skip degenerate edges
+        points = np.array(
+            edge.discretize(
+                Angular=angular_deflection, Curvature=deflection, Minimum=2
+            ),
+            dtype=np.float64,
+        )
+        if comp._should_flip_list is not None and comp._should_flip_list[index]:
+            points = points[::-1]
+        chunks.append(points if not chunks else points[1:])
+    if not chunks:
+        return np.empty((0, 3))
+    return enforce_segment_lengths(np.concatenate(chunks), min_length, max_length)
+
+
+def discretize_list_of_edges(edge_list, spacing):
+    return [FreeCAD.Vector(*x) for x in discretize_edges(edge_list, spacing)]
 
 
 def discretize_intermittent(
@@ -111,21 +536,28 @@ def discretize_intermittent(
     stitch_length: float,
     pitch: float,
     start_offset: float,
-):
-    points = []
+    layout: str = "Offset",
+) -> PolylineArray:
+    """Discretize the stitches of an intermittent weld along a list of connected
+    edges, one polyline per stitch. Stitches are placed by
+    weld_metrics.stitch_intervals, and the points of every stitch are evaluated
+    in a single pass over the edges"""
     comp = CompositeEdge(edge_list)
-    i = start_offset
-
-    number_to_split_into = max(2, math.floor(stitch_length / spacing))
-
-    while i + stitch_length < comp.Length:
-        this_stitch = []
-        for j in range(number_to_split_into + 1):
-            pos = i + stitch_length / number_to_split_into * j
-            this_stitch.append(comp.valueAt(pos))
-        points.append(this_stitch)
-        i += pitch
-    return points
+    intervals = stitch_intervals(
+        comp.Length, stitch_length, pitch, start_offset, layout
+    )
+    lengths = intervals[:, 1] - intervals[:, 0]
+    segments = np.maximum(2, np.floor(lengths / spacing)).astype(np.int64)
+    offsets = np.zeros(len(intervals) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(segments + 1)
+    # the index of each point within its stitch
+    steps = np.arange(offsets[-1]) - np.repeat(offsets[:-1], segments + 1)
+    params = np.repeat(intervals[:, 0], segments + 1) + steps * np.repeat(
+        lengths / segments, segments + 1
+    )
+    params = np.clip(params, 0.0, comp.Length)
+    points = comp.valueAtMany(params)
+    return PolylineArray([tuple(x) for x in points], offsets)
 
 
 def _discretize_list_of_edges(edge_list, spacing):
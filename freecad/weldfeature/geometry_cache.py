@@ -0,0 +1,210 @@
+import collections
+import hashlib
+import struct
+import threading
+import FreeCAD
+
+PARAMETER_PATH = "User parameter:BaseApp/Preferences/Mod/WeldFeature"
+
+
+def geometry_fingerprint(edges, ndigits=6) -> str:
+    """Compute a fingerprint for a sequence of edges from their curve geometry.
+    Unlike the identity or hash of a Part.Shape, this stays the same when a
+    document object recomputes into identical geometry"""
+    digest = hashlib.blake2b(digest_size=16)
+    for edge in edges:
+        _update_edge_digest(digest, edge, ndigits)
+    return digest.hexdigest()
+
+
+def _update_edge_digest(digest, edge, ndigits):
+    if edge.isNull():
+        digest.update(b"null")
+        return
+    try:
+        curve = edge.Curve
+        curve_type = type(curve).__name__
+    except TypeError:
+        # raised by FreeCAD for curve types that have no python wrapper
+        curve, curve_type = None, "undefined"
+    digest.update(curve_type.encode())
+    _update_points_digest(digest, [x.Point for x in edge.Vertexes], ndigits)
+    # the vertexes don't tell apart edges that share their ends, such as arcs of
+    # different radii, so the length and some inner points are hashed too
+    first, last = edge.ParameterRange
+    inner_points = [edge.valueAt(first + x * (last - first)) for x in (0.25, 0.5, 0.75)]
+    _update_points_digest(digest, inner_points, ndigits)
+    _update_floats_digest(digest, [edge.Length], ndigits)
+    if hasattr(curve, "getPoles"):
+        # B-spline and Bezier curves
+        _update_points_digest(digest, curve.getPoles(), ndigits)
+        _update_floats_digest(digest, curve.getWeights(), ndigits)
+    if hasattr(curve, "getKnots"):
+        _update_floats_digest(digest, curve.getKnots(), ndigits)
+
+
+def _update_points_digest(digest, points, ndigits):
+    for point in points:
+        _update_floats_digest(digest, point, ndigits)
+
+
+def _update_floats_digest(digest, values, ndigits):
+    # adding 0.0 turns -0.0 into 0.0, so both hash the same
+    values = [round(x, ndigits) + 0.0 for x in values]
+    digest.update(struct.pack(f"<{len(values)}d", *values))
+
+
+def edge_set_fingerprint(edges, ndigits=6) -> str:
+    """Like geometry_fingerprint, but independent of the order of the edges"""
+    digests = sorted(geometry_fingerprint([x], ndigits) for x in edges)
+    return hashlib.blake2b("".join(digests).encode(), digest_size=16).hexdigest()
+
+
+class LRUCache:
+    """A least-recently-used cache, bounded by the approximate memory used by its
+    entries rather than by their count. Cached values must have an nbytes
+    attribute giving their approximate size in memory"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._total_bytes = 0
+        # welds may be computed in a background thread
+        self._lock = threading.RLock()
+
+    def get(self, key, factory):
+        """Return the value cached for key, calling factory() to create it if
+        it isn't cached yet. factory() runs without holding the lock, so that a
+        slow computation doesn't block other threads. If two threads compute the
+        same key at once, the value of the first to finish is kept"""
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        value = factory()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self._entries[key] = value
+            self._total_bytes += value.nbytes
+            # always keep the most recent entry, even if it is larger than the limit
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                self.discard(next(iter(self._entries)))
+            return value
+
+    def discard(self, key):
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self._total_bytes -= value.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class GeometryCache(LRUCache):
+    """A cache of geometry derived from the shapes of document objects.
+
+    Entries are keyed by the geometry fingerprint of the owning object's shape,
+    so objects with identical geometry share an entry. The fingerprint of each
+    owner is remembered until that owner is invalidated (I.E.: recomputed), so
+    repeated lookups don't need to re-inspect the shape"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(max_bytes)
+        self._fingerprints = {}
+        self._owners = collections.defaultdict(set)
+        # bumped by every invalidation, so that lookups that were running at the
+        # time don't record a fingerprint of geometry that has since changed
+        self._generation = 0
+
+    def lookup(self, owner: str, shape, factory):
+        """Return factory(shape), reusing a previously computed value if the
+        geometry is unchanged. The fingerprint and the value are computed without
+        holding the lock, so invalidations from the GUI thread never wait for a
+        lookup in a background thread"""
+        with self._lock:
+            fingerprint = self._fingerprints.get(owner)
+            generation = self._generation
+        if fingerprint is None:
+            fingerprint = geometry_fingerprint(shape.Edges)
+        value = self.get(fingerprint, lambda: factory(shape))
+        with self._lock:
+            if self._generation == generation and fingerprint in self._entries:
+                self._fingerprints[owner] = fingerprint
+                self._owners[fingerprint].add(owner)
+        return value
+
+    def invalidate(self, owner: str):
+        """Forget everything derived from the geometry of owner"""
+        with self._lock:
+            self._generation += 1
+            self._fingerprints.pop(owner, None)
+            stale = [k for k, v in self._owners.items() if owner in v]
+            for fingerprint in stale:
+                self.discard(fingerprint)
+
+    def discard(self, key):
+        with self._lock:
+            super().discard(key)
+            for owner in self._owners.pop(key, ()):
+                if self._fingerprints.get(owner) == key:
+                    del self._fingerprints[owner]
+
+    def clear(self):
+        with self._lock:
+            super().clear()
+            self._generation += 1
+            self._fingerprints.clear()
+            self._owners.clear()
+
+
+class _GeometryCacheObserver:
+    """Document observer that invalidates cached geometry when objects are
+    recomputed or deleted, and drops the caches of closed documents"""
+
+    def slotRecomputedObject(self, obj):
+        cache = _document_caches.get(obj.Document.Name)
+        if cache is not None:
+            cache.invalidate(obj.Name)
+
+    def slotDeletedObject(self, obj):
+        self.slotRecomputedObject(obj)
+
+    def slotDeletedDocument(self, doc):
+        _document_caches.pop(doc.Name, None)
+
+
+_document_caches = {}
+_observer = None
+
+
+def get_document_cache(doc) -> GeometryCache:
+    """Get the geometry cache shared by all weld features in a document"""
+    global _observer
+    if _observer is None:
+        _observer = _GeometryCacheObserver()
+        FreeCAD.addDocumentObserver(_observer)
+    cache = _document_caches.get(doc.Name)
+    if cache is None:
+        params = FreeCAD.ParamGet(PARAMETER_PATH)
+        max_megabytes = params.GetInt("GeometryCacheSizeMB", 64)
+        cache = GeometryCache(max_megabytes * 1024 * 1024)
+        _document_caches[doc.Name] = cache
+    return cache
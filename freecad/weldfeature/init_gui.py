@@ -2,6 +2,7 @@ import os
 # import __main__
 import FreeCADGui
 from freecad.weldfeature.command_add_weldfeature import AddWeldFeatureCommand
+from freecad.weldfeature.command_weld_report import WeldReportCommand
 
 #
 # def toolbar_manipulation(name):
@@ -33,6 +34,7 @@ from freecad.weldfeature.command_add_weldfeature import AddWeldFeatureCommand
 
 # Add the GUI command
 FreeCADGui.addCommand("WeldFeature_Add", AddWeldFeatureCommand())
+FreeCADGui.addCommand("WeldFeature_Report", WeldReportCommand())
 
 
 # This shouldn't need an entire workbench
@@ -57,6 +59,7 @@ class WeldWorkbench(FreeCADGui.Workbench):
             "WeldFeature",
             [
                 "WeldFeature_Add",
+                "WeldFeature_Report",
             ],
         )
         self.appendToolbar(
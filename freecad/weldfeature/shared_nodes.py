@@ -0,0 +1,112 @@
+import pivy.coin as coin
+
+
+class SharedNodeRegistry:
+    """Reference counted scene graph nodes, shared by every weld view provider
+    that asks for the same key. A node is forgotten once it has been released
+    as many times as it was acquired; the scene graphs it's still part of keep
+    it alive until they let go of it too"""
+
+    def __init__(self):
+        self._nodes = {}
+        self._counts = {}
+
+    def acquire(self, key, factory):
+        """Return the node shared under key, calling factory() to create it if
+        nobody holds it yet"""
+        node = self._nodes.get(key)
+        if node is None:
+            node = factory()
+            self._nodes[key] = node
+            self._counts[key] = 0
+        self._counts[key] += 1
+        return node
+
+    def release(self, key):
+        if key not in self._counts:
+            return
+        self._counts[key] -= 1
+        if self._counts[key] <= 0:
+            del self._counts[key]
+            del self._nodes[key]
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def reference_count(self, key) -> int:
+        return self._counts.get(key, 0)
+
+
+registry = SharedNodeRegistry()
+
+
+def _rounded(values, ndigits=4):
+    # keys are rounded so that tiny float differences don't split shared nodes
+    return tuple(round(float(x), ndigits) for x in values)
+
+
+def sphere_key(radius):
+    return ("sphere", round(float(radius), 6))
+
+
+def make_sphere(radius):
+    sphere = coin.SoSphere()
+    sphere.radius.setValue(radius)
+    return sphere
+
+
+def cylinder_key(radius):
+    return ("cylinder", round(float(radius), 6))
+
+
+def make_cylinder(radius):
+    # a unit height cylinder without top or bottom, to be scaled along each
+    # segment of the weld
+    cylinder = coin.SoCylinder()
+    cylinder.radius.setValue(radius)
+    cylinder.height.setValue(1.0)
+    cylinder.parts.setValue(coin.SoCylinder.SIDES)
+    return cylinder
+
+
+def endcap_key(style, size):
+    return ("endcap", style, round(float(size), 6))
+
+
+def make_endcap(style, size):
+    """Build the geometry placed at the ends of weld beads. Caps point along
+    the +Y axis"""
+    match style:
+        case "Flat":
+            cap_shape = coin.SoCylinder()
+            cap_shape.radius.setValue(size)
+            cap_shape.height.setValue(0.0)
+            cap_shape.parts.setValue(coin.SoCylinder.TOP)
+        case "Rounded":
+            cap_shape = coin.SoSphere()
+            cap_shape.radius.setValue(size)
+        case "Pointed":
+            cone = coin.SoCone()
+            cone.bottomRadius.setValue(size)
+            cone.height.setValue(size)
+            cone.parts.setValue(coin.SoCone.SIDES)
+            translate = coin.SoTranslation()
+            translate.translation.setValue(coin.SbVec3f(0.0, 0.5 * size, 0.0))
+            cap_shape = coin.SoSeparator()
+            cap_shape.addChild(translate)
+            cap_shape.addChild(cone)
+        case _:
+            raise ValueError(f"Unknown end cap style: {style}")
+    return cap_shape
+
+
+def material_key(*colors):
+    return ("material",) + tuple(_rounded(x[:3]) for x in colors)
+
+
+def make_material(*colors):
+    """An SoMaterial with one diffuse color for each of colors"""
+    material = coin.SoMaterial()
+    rgb = [list(_rounded(x[:3])) for x in colors]
+    material.diffuseColor.setValues(0, len(rgb), rgb)
+    return material
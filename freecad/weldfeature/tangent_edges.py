@@ -1,34 +1,56 @@
+import collections
+import itertools
 import math
-from functools import lru_cache
-from itertools import combinations
+import numpy as np
 import Part
-from scipy.sparse import csr_matrix
-from scipy.sparse.csgraph import dijkstra
-from .geom_utils import should_flip_edges
+from .geometry_cache import get_document_cache
+from . import tracing
 
-# import numpy as np
 
+def edge_endpoint_data(edges):
+    """Evaluate the endpoints of each edge, along with the tangent directions
+    pointing away from the edge at those endpoints. Each edge is evaluated exactly
+    once. Returns two (E, 2, 3) arrays, indexed by [edge, end, xyz], where end 0 is
+    the first parameter of the edge and end 1 is the last"""
+    points = np.empty((len(edges), 2, 3))
+    tangents = np.empty((len(edges), 2, 3))
+    for i, edge in enumerate(edges):
+        first_param, last_param = edge.ParameterRange
+        points[i, 0] = tuple(edge.valueAt(first_param))
+        points[i, 1] = tuple(edge.valueAt(last_param))
+        tangents[i, 0] = tuple(edge.derivative1At(first_param) * -1)
+        tangents[i, 1] = tuple(edge.derivative1At(last_param))
+    return points, tangents
 
-def edges_are_connected(edge1, edge2):
-    try:
-        _ = should_flip_edges(edge1, edge2)
-    except RuntimeError:
-        return False
-    return True
 
+def coincident_endpoints(points, eps=1e-5):
+    """Yield pairs of flat endpoint indexes (2 * edge_index + end) whose points lie
+    within eps of each other. Endpoints are hashed into a grid of cells of size
+    eps, so only points in neighbouring cells are ever compared"""
+    flat_points = points.reshape(-1, 3)
+    coordinates = flat_points.tolist()
+    cells = np.floor(flat_points / eps).astype(np.int64).tolist()
+    grid = collections.defaultdict(list)
+    for index, cell in enumerate(cells):
+        grid[tuple(cell)].append(index)
+    neighbourhood = list(itertools.product((-1, 0, 1), repeat=3))
+    for (x, y, z), members in grid.items():
+        for dx, dy, dz in neighbourhood:
+            others = grid.get((x + dx, y + dy, z + dz))
+            if others is None:
+                continue
+            for a in members:
+                for b in others:
+                    # report each pair once, from the cell of its lower index
+                    if a < b and math.dist(coordinates[a], coordinates[b]) < eps:
+                        yield a, b
 
-def angle_between_connected_endpoints(edge1, edge2):
-    flip_first, flip_last = should_flip_edges(edge1, edge2)
-    if not flip_first:
-        v1 = edge1.derivative1At(edge1.LastParameter)
-    else:
-        v1 = edge1.derivative1At(edge1.FirstParameter) * -1
-    if flip_last:
-        v2 = edge2.derivative1At(edge2.LastParameter)
-    else:
-        v2 = edge2.derivative1At(edge2.FirstParameter) * -1
-    angle = v1.getAngle(v2)  # in radians
-    return angle
+
+def angle_between_vectors(v1, v2):
+    norms = np.linalg.norm(v1) * np.linalg.norm(v2)
+    if norms == 0.0:
+        return 0.0
+    return math.acos(max(-1.0, min(1.0, float(np.dot(v1, v2)) / norms)))
 
 
 def get_edgeweight(angle: float):
@@ -37,35 +59,126 @@ def get_edgeweight(angle: float):
     return int(angle > math.pi * 0.99)
 
 
-@lru_cache(maxsize=64)
-# def propagate(shape: Part.Shape, edge_index: int) -> list:
-def propagate(shape: Part.Shape):
-    weights = []
-    rows = []
-    cols = []
-    msize = len(shape.Edges)
-    for comb in combinations(enumerate(shape.Edges), 2):
-        i, edge_i = comb[0]
-        j, edge_j = comb[1]
-        if edges_are_connected(edge_i, edge_j):
-            w = get_edgeweight(angle_between_connected_endpoints(edge_i, edge_j))
-            if w > 0:
-                weights.append(w)
-                rows.append(i)
-                cols.append(j)
-        # print(f"Edge{i+1}<->Edge{j+1}")
-
-    adjacency_matrix = csr_matrix((weights, (rows, cols)), shape=(msize, msize))
-    dist_matrix, predecessors = dijkstra(
-        adjacency_matrix, directed=False, return_predecessors=True, limit=100.0
-    )
-    # get the indexes in dist_matrix[edge_index] that aren't -inf
-    # row = list(dist_matrix[edge_index])
-    # print(row)
-    # expanded_edge_set = [i for i in range(len(row)) if row[i] < float('inf')]
-    return dist_matrix
-    # print(predecessors)
-    # return expanded_edge_set
+def connected_component_labels(number_of_nodes: int, pairs) -> list[int]:
+    """Label the connected components of an undirected graph given as a list of
+    node index pairs, using a union-find. Nodes in the same component share
+    a label"""
+    parent = list(range(number_of_nodes))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]  # path halving
+            i = parent[i]
+        return i
+
+    for i, j in pairs:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+    return [find(i) for i in range(number_of_nodes)]
+
+
+class TangentEdgeComponents:
+    """The edges of a shape, grouped into sets that are joined end to end by
+    tangent-continuous connections"""
+
+    def __init__(self, labels: list[int]):
+        self.labels = labels
+        self._members = collections.defaultdict(list)
+        for index, label in enumerate(labels):
+            self._members[label].append(index)
+
+    def connected_edges(self, edge_index: int) -> list[int]:
+        """indexes of all edges tangent-connected to edge_index, itself included"""
+        return self._members[self.labels[edge_index]]
+
+
+class EdgeGeometryIndex:
+    """Endpoints, tangents, tangent adjacency and tangent-connected components of
+    all edges of a shape. Building this is the expensive part of propagating a
+    selection, so instances are kept in a per-document GeometryCache"""
+
+    def __init__(self, shape: Part.Shape):
+        with tracing.span("EdgeGeometryIndex") as counts:
+            edges = shape.Edges
+            self.points, self.tangents = edge_endpoint_data(edges)
+            tangent_joints = []
+            for a, b in coincident_endpoints(self.points):
+                i, end_i = divmod(a, 2)
+                j, end_j = divmod(b, 2)
+                if i == j:
+                    continue  # closed edges touch themselves
+                # the tangents point away from each edge, so they are antiparallel
+                # where one edge continues smoothly into the other
+                w = get_edgeweight(
+                    angle_between_vectors(
+                        self.tangents[i, end_i], self.tangents[j, end_j]
+                    )
+                )
+                if w > 0:
+                    tangent_joints.append((i, j))
+            self.adjacency = np.array(tangent_joints, dtype=np.int64).reshape(-1, 2)
+            self.components = TangentEdgeComponents(
+                connected_component_labels(len(edges), tangent_joints)
+            )
+            counts["edges"] = len(edges)
+            counts["tangent_joints"] = len(tangent_joints)
+
+    @property
+    def nbytes(self) -> int:
+        # the component lookup tables hold roughly two python ints per edge
+        return (
+            self.points.nbytes
+            + self.tangents.nbytes
+            + self.adjacency.nbytes
+            + 64 * len(self.components.labels)
+        )
+
+
+@tracing.traced("propagate")
+def propagate(shape: Part.Shape) -> TangentEdgeComponents:
+    return EdgeGeometryIndex(shape).components
+
+
+def cached_geometry_index(base_object, shape=None) -> EdgeGeometryIndex:
+    """shape may be given if base_object.Shape has already been read, which
+    saves copying it again"""
+    if shape is None:
+        shape = base_object.Shape
+    if isinstance(base_object, ShapeSnapshot):
+        cache = base_object.geometry_cache
+    else:
+        cache = get_document_cache(base_object.Document)
+    return cache.lookup(base_object.Name, shape, EdgeGeometryIndex)
+
+
+class ShapeSnapshot:
+    """A detached copy of the parts of a document object that
+    expand_selection_to_geometry uses, which can safely be handed to a
+    background thread. Must be created in the GUI thread"""
+
+    def __init__(self, base_object):
+        self.Name = base_object.Name
+        # a deep copy, so that no OCC data is shared with the document while the
+        # GUI thread meshes or recomputes the base object
+        self.Shape = base_object.Shape.copy()
+        # resolved here, since creating a document cache registers an observer
+        self.geometry_cache = get_document_cache(base_object.Document)
+
+
+def unique_edges(edges) -> list[Part.Edge]:
+    """Drop edges that are the same topological edge as an earlier one, such as
+    the edges shared by adjacent faces, or edges that were selected twice. Edges
+    are bucketed by hash code, so isSame is only called on edges that collide"""
+    buckets = collections.defaultdict(list)
+    unique = []
+    for edge in edges:
+        bucket = buckets[edge.hashCode()]
+        if any(edge.isSame(x) for x in bucket):
+            continue
+        bucket.append(edge)
+        unique.append(edge)
+    return unique
 
 
 def expand_selection_to_geometry(geom_selection, expand=False) -> list[Part.Edge]:
@@ -77,31 +190,30 @@ def expand_selection_to_geometry(geom_selection, expand=False) -> list[Part.Edge
         # ignoring which document objects those edges originally belonged to.
         if not hasattr(base_object, "Shape"):
             continue
-        if base_object.Shape.isNull():
+        # reading Shape copies it, so it is only read once per object. Every
+        # edge is then taken from that copy, which lets unique_edges recognize
+        # edges that are selected more than once
+        shape = base_object.Shape
+        if shape.isNull():
             continue  # yet another check for null garbage on document restore
+        all_edges = None
         for subel in subelement_names:
             if subel.startswith("Edge"):
                 if expand:
-                    index = int(subel.lstrip("Edge")) - 1
-                    dist_matrix = propagate(base_object.Shape)
-                    row = list(dist_matrix[index])
-                    expanded_index_list = [
-                        i for i in range(len(row)) if row[i] < float("inf")
-                    ]
+                    if all_edges is None:
+                        all_edges = shape.Edges
+                        geometry_index = cached_geometry_index(base_object, shape)
+                    edge_index = int(subel.lstrip("Edge")) - 1
                     unsorted_edges.extend(
-                        list(
-                            map(
-                                lambda x: base_object.Shape.Edges[x],
-                                expanded_index_list,
-                            )
-                        )
+                        all_edges[x]
+                        for x in geometry_index.components.connected_edges(edge_index)
                     )
                 else:
-                    unsorted_edges.append(base_object.getSubObject(subel))
+                    unsorted_edges.append(shape.getElement(subel))
             elif subel.startswith("Face"):
-                unsorted_edges.extend(base_object.getSubObject(subel).Edges)
+                unsorted_edges.extend(shape.getElement(subel).Edges)
             else:
                 raise RuntimeError(
                     f"Subelement {subel} of {base_object.Name} is not a face or edge"
                 )
-    return unsorted_edges
+    return unique_edges(unsorted_edges)
@@ -156,10 +156,12 @@ class WeldFeatureTaskPanel:
 
     def changeCheckBoxPropagateSelection(self, checked):
         self.feature.PropagateSelection = checked
+        self.feature.recompute()
         self.updateUI()
 
     def changeCheckBoxIntermittentWeld(self, checked):
         self.feature.IntermittentWeld = checked
+        self.feature.recompute()
         self.updateUI()
 
     def changeCheckBoxAllAround(self, checked):
@@ -176,18 +178,22 @@ class WeldFeatureTaskPanel:
 
     def changeWeldSize(self, val):
         self.feature.WeldSize = val
+        self.feature.recompute()
         self.updateUI()
 
     def changeIntermittentWeldLength(self, val):
         self.feature.IntermittentWeldLength = val
+        self.feature.recompute()
         self.updateUI()
 
     def changeIntermittentWeldPitch(self, val):
         self.feature.IntermittentWeldPitch = val
+        self.feature.recompute()
         self.updateUI()
 
     def changeIntermittentWeldOffset(self, val):
         self.feature.IntermittentWeldOffset = val
+        self.feature.recompute()
         self.updateUI()
 
     def updateUI(self):
@@ -0,0 +1,169 @@
+import atexit
+import collections
+import contextlib
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+import FreeCAD
+from .geometry_cache import PARAMETER_PATH
+
+# Opt-in instrumentation of the weld pipeline. Tracing is enabled by setting the
+# WELDFEATURE_TRACE environment variable, or the "Trace" preference. Each traced
+# weld prints a summary of its stages to the report view, and every stage is
+# appended to a trace-event file that can be opened with chrome://tracing or
+# https://ui.perfetto.dev. The file is set by WELDFEATURE_TRACE_FILE or the
+# "TraceFile" preference, and is overwritten when FreeCAD restarts, or when
+# traces are sent to another file
+
+# the preferences that a trace was started with. They are read when a trace
+# starts, or once up front for traces that run away from the GUI thread
+TraceSettings = collections.namedtuple("TraceSettings", ["enabled", "trace_file"])
+
+_local = threading.local()
+_file_lock = threading.Lock()
+_trace_file = None
+_trace_file_path = None
+
+
+def is_enabled() -> bool:
+    if os.environ.get("WELDFEATURE_TRACE", "0") not in ("", "0"):
+        return True
+    return FreeCAD.ParamGet(PARAMETER_PATH).GetBool("Trace", False)
+
+
+def trace_file_path() -> str:
+    path = os.environ.get("WELDFEATURE_TRACE_FILE")
+    if not path:
+        path = FreeCAD.ParamGet(PARAMETER_PATH).GetString("TraceFile", "")
+    return path or os.path.join(tempfile.gettempdir(), "weldfeature_trace.json")
+
+
+def read_settings() -> TraceSettings:
+    """Read the tracing preferences. Must be called from the GUI thread"""
+    enabled = is_enabled()
+    return TraceSettings(enabled, trace_file_path() if enabled else None)
+
+
+@contextlib.contextmanager
+def span(name, weld=None, settings=None):
+    """Time a stage of the pipeline. Yields a dict, in which the stage can record
+    counts of the items it processed.
+
+    Stages are only recorded inside a trace. A trace is started by a span that
+    names the weld object it belongs to, if tracing is enabled. Otherwise spans
+    cost next to nothing. Traces started away from the GUI thread must be given
+    the settings from read_settings(), since preferences can't be read there"""
+    stack = getattr(_local, "stack", None)
+    if not stack:
+        if weld is None:
+            yield {}
+            return
+        if settings is None:
+            settings = read_settings()
+        if not settings.enabled:
+            yield {}
+            return
+        stack = _local.stack = []
+        _local.weld = weld
+        _local.trace_file = settings.trace_file
+        _local.events = []
+    counts = {}
+    stack.append(name)
+    start = time.perf_counter_ns()
+    try:
+        yield counts
+    finally:
+        duration = time.perf_counter_ns() - start
+        stack.pop()
+        _local.events.append((name, start, duration, len(stack), counts))
+        if not stack:
+            _finish_trace(_local.weld, _local.events, _local.trace_file)
+
+
+def traced(name):
+    """Decorator form of span, for functions that are always a stage"""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _finish_trace(weld, events, trace_file):
+    _print_summary(weld, events)
+    pid = os.getpid()
+    tid = threading.get_ident()
+    trace_events = [
+        {
+            "name": name,
+            "cat": "weldfeature",
+            "ph": "X",
+            "ts": start / 1000.0,
+            "dur": duration / 1000.0,
+            "pid": pid,
+            "tid": tid,
+            "args": {"weld": weld, **counts},
+        }
+        for name, start, duration, _, counts in events
+    ]
+    _write_events(trace_events, trace_file)
+
+
+def _print_summary(weld, events):
+    """Print the time spent in each stage, summed over repeated calls"""
+    totals = collections.OrderedDict()
+    # events are recorded as they finish, so report them in the order they began
+    for name, start, duration, depth, counts in sorted(events, key=lambda x: x[1]):
+        key = (depth, name)
+        total = totals.setdefault(key, {"calls": 0, "duration": 0, "counts": {}})
+        total["calls"] += 1
+        total["duration"] += duration
+        for count_name, value in counts.items():
+            total["counts"][count_name] = total["counts"].get(count_name, 0) + value
+    lines = [f"Weld trace of {weld}:"]
+    for (depth, name), total in totals.items():
+        details = [f"{k}={v}" for k, v in total["counts"].items()]
+        if total["calls"] > 1:
+            details.insert(0, f"calls={total['calls']}")
+        suffix = f" ({', '.join(details)})" if details else ""
+        milliseconds = total["duration"] / 1e6
+        lines.append(f"{'  ' * (depth + 1)}{name}: {milliseconds:.2f} ms{suffix}")
+    FreeCAD.Console.PrintMessage("\n".join(lines) + "\n")
+
+
+def _write_events(trace_events, path):
+    # The file uses the JSON array format of trace events, in which the closing
+    # bracket is optional. That way, events can be appended without rewriting.
+    # The file is opened by the first trace, and kept until the configured path
+    # changes or FreeCAD exits
+    global _trace_file, _trace_file_path
+    with _file_lock:
+        if _trace_file is not None and _trace_file_path != path:
+            _trace_file.close()
+            _trace_file = None
+        if _trace_file is None:
+            _trace_file = open(path, "w", encoding="utf-8")
+            _trace_file_path = path
+            _trace_file.write("[\n")
+        for event in trace_events:
+            _trace_file.write(json.dumps(event) + ",\n")
+        _trace_file.flush()
+
+
+@atexit.register
+def close_trace_file():
+    """Close the trace file, if one is open. The next trace starts a new file"""
+    global _trace_file, _trace_file_path
+    with _file_lock:
+        if _trace_file is not None:
+            _trace_file.close()
+        _trace_file = None
+        _trace_file_path = None
@@ -1,13 +1,29 @@
 import os
 import math
-import FreeCAD
+import weakref
+import numpy as np
 import FreeCADGui
 from PySide import QtGui
 from freecad.weldfeature import ICONPATH
 import pivy.coin as coin
+from .geom_utils import coin_transform_matrices
+from .geom_utils import tube_mesh
 from .gui_utils import get_complementary_shade
+from . import shared_nodes
+from . import tracing
 from .task_weldfeature import WeldFeatureTaskPanel
 
+# the diffuse color of a default SoMaterial
+DEFAULT_COLOR = (0.8, 0.8, 0.8)
+
+# parts of the scene graph that can be updated independently
+PATH = "path"  # positions of the primitives, polylines, and markers
+RADIUS = "radius"  # sizes of the primitives
+CAP_SHAPE = "cap shape"
+LEVEL_OF_DETAIL = "level of detail"  # switching ranges and the reduced tube
+TUBE = "tube"
+MATERIALS = "materials"
+
 
 class ViewProviderWeldFeature:
     def __init__(self, vobj):
@@ -52,40 +68,40 @@ class ViewProviderWeldFeature:
     def attach(self, vobj):
         self._init_scene_graph(vobj)
         vobj.addDisplayMode(self.default_display_group, "Shaded")
+        vobj.addDisplayMode(self.tube_display_group, "Tube")
         vobj.addDisplayMode(self.wireframe_display_group, "Wireframe")
 
     def updateData(self, fp, prop):
-        weld_position_properties = [
-            "Base",
-            "PropagateSelection",
-            "IntermittentWeld",
-            "IntermittentWeldPitch",
-            "IntermittentWeldLength",
-            "IntermittentWeldOffset",
-        ]
-        if prop in weld_position_properties:
-            # recompute the entire weld bead shape
-            self._setup_weld_bead(fp)
+        if prop == "WeldLength":
+            # WeldLength is set each time the feature rebuilds its vertices,
+            # so this is the signal that the weld bead shape may need to be
+            # redrawn. Recomputes often produce the same path though, E.G.: when
+            # only the intermittent parameters of a continuous weld change
+            polylines = getattr(fp.Proxy, "_vertices", None)
+            path_fingerprint = None if polylines is None else polylines.fingerprint()
+            if path_fingerprint != self._path_fingerprint:
+                self._path_fingerprint = path_fingerprint
+                self._invalidate(fp, PATH, LEVEL_OF_DETAIL, TUBE)
         if prop == "WeldSize":
-            # disallow really small weld sizes
-            new_size = float(fp.WeldSize.getValueAs("mm"))
-            self.sphere.radius.setValue(0.99 * new_size)
-            self.intermediate_cyl.radius.setValue(new_size)
-            self._setup_weld_bead(fp)
+            # the primitives are rescaled, but don't need to move
+            self._invalidate(fp, RADIUS, CAP_SHAPE, LEVEL_OF_DETAIL, TUBE)
         return
 
     def getDisplayModes(self, obj):
         """
         Return a list of display modes.
         """
-        return ["Shaded", "Wireframe"]
+        return ["Shaded", "Tube", "Wireframe"]
 
     def getDefaultDisplayMode(self):
         return "Shaded"
 
     def onChanged(self, vp, prop):
+        if prop == "DisplayMode":
+            # the tube mesh may have been left out of date while hidden
+            self._invalidate(vp.Object)
         if prop == "EndCapStyle":
-            self._adjust_endcaps(vp.Object)
+            self._invalidate(vp.Object, CAP_SHAPE)
         if prop == "AutoSetAlternatingColor":
             if vp.AutoSetAlternatingColor:
                 rgb = vp.ShapeColor[:3]
@@ -116,7 +132,7 @@ class ViewProviderWeldFeature:
                 vp.AlternatingColor = alternate_color
                 vp.setPropertyStatus("AlternatingColor", "ReadOnly")
         if prop in ["ShapeColor", "AlternatingColor", "DrawWithAlternatingColors"]:
-            self._set_geom_colors(vp)
+            self._invalidate(vp.Object, MATERIALS)
 
     def getIcon(self):
         return os.path.join(ICONPATH, "WeldFeature.svg")
@@ -157,29 +173,32 @@ class ViewProviderWeldFeature:
         self.main_intermediate_cylinders = coin.SoSeparator()
         self.alt_intermediate_cylinders = coin.SoSeparator()
 
-        self.main_material = coin.SoMaterial()
+        # primitives and materials are shared with every other weld that has the
+        # same size, end caps, or colors. Default to 1mm sizes
+        self._shared_keys = {}
+        # filled in once the groups holding the shared nodes exist
+        self._shared_parents = {}
+        weakref.finalize(self, _release_shared_nodes, self._shared_keys)
+        self._use_shared_node("main_material", *_material(DEFAULT_COLOR))
+        self._use_shared_node("alt_material", *_material(DEFAULT_COLOR))
+        self._use_shared_node("tube_material", *_material(DEFAULT_COLOR, DEFAULT_COLOR))
+        self._use_shared_node("sphere", *_sphere(0.99))
+        self._use_shared_node("intermediate_cyl", *_cylinder(1.0))
+        self._use_shared_node("endcap", *_endcap("Flat", 1.0))
+
         self.start_and_end_caps.addChild(self.main_material)
         self.intermediate_spheres.addChild(self.main_material)
         self.main_intermediate_cylinders.addChild(self.main_material)
 
-        self.alt_material = coin.SoMaterial()
         self.alt_intermediate_cylinders.addChild(self.alt_material)
 
-        self.sphere = coin.SoSphere()
-        self.intermediate_cyl = coin.SoCylinder()
-        # default to 1mm sizes
-        self.sphere.radius.setValue(0.99)
-        self.intermediate_cyl.radius.setValue(1.0)
-        self.intermediate_cyl.height.setValue(1.0)
-        self.intermediate_cyl.parts.setValue(coin.SoCylinder.SIDES)
-
         self.copies_of_spheres = coin.SoMultipleCopy()
         self.copies_of_spheres.addChild(self.sphere)
 
         self.copies_of_cyls = coin.SoMultipleCopy()
         self.alt_copies_of_cyls = coin.SoMultipleCopy()
         self.copies_of_endcaps = coin.SoMultipleCopy()
-        self.copies_of_endcaps.addChild(coin.SoCube())
+        self.copies_of_endcaps.addChild(self.endcap)
         self.copies_of_cyls.addChild(self.intermediate_cyl)
         self.alt_copies_of_cyls.addChild(self.intermediate_cyl)
         self.start_and_end_caps.addChild(self.copies_of_endcaps)
@@ -188,134 +207,374 @@ class ViewProviderWeldFeature:
         self.alt_intermediate_cylinders.addChild(self.alt_copies_of_cyls)
         self.intermediate_spheres.addChild(self.copies_of_spheres)
 
-        self.default_display_group.addChild(self.start_and_end_caps)
-        self.default_display_group.addChild(self.intermediate_spheres)
-        self.default_display_group.addChild(self.main_intermediate_cylinders)
-        self.default_display_group.addChild(self.alt_intermediate_cylinders)
+        self.full_detail = coin.SoSeparator()
+        self.full_detail.addChild(self.start_and_end_caps)
+        self.full_detail.addChild(self.intermediate_spheres)
+        self.full_detail.addChild(self.main_intermediate_cylinders)
+        self.full_detail.addChild(self.alt_intermediate_cylinders)
+
+        # a single continuous mesh around each polyline
+        self.tube_display_group = coin.SoSeparator()
+        self.tube_mesh = coin.SoSeparator()
+        hints = _tube_shape_hints()
+        self.tube_coords = coin.SoCoordinate3()
+        self.tube_normals = coin.SoNormal()
+        normal_binding = coin.SoNormalBinding()
+        normal_binding.value = coin.SoNormalBinding.PER_VERTEX_INDEXED
+        # the tube material holds the main and alternating colors, and each
+        # face picks one of them
+        material_binding = coin.SoMaterialBinding()
+        material_binding.value = coin.SoMaterialBinding.PER_FACE_INDEXED
+        self.tube_faces = coin.SoIndexedFaceSet()
+        for node in (
+            hints,
+            self.tube_coords,
+            self.tube_normals,
+            normal_binding,
+            self.tube_material,
+            material_binding,
+            self.tube_faces,
+        ):
+            self.tube_mesh.addChild(node)
+        self.tube_full_detail = coin.SoSeparator()
+        self.tube_full_detail.addChild(self.start_and_end_caps)
+        self.tube_full_detail.addChild(self.tube_mesh)
+
+        # distant welds are drawn as a coarse tube with fewer points and
+        # sides, and very distant welds as plain lines
+        self.reduced_detail = coin.SoSeparator()
+        self.reduced_detail.addChild(self.main_material)
+        self.reduced_detail.addChild(_tube_shape_hints())
+        self.reduced_coords = coin.SoCoordinate3()
+        self.reduced_normals = coin.SoNormal()
+        reduced_normal_binding = coin.SoNormalBinding()
+        reduced_normal_binding.value = coin.SoNormalBinding.PER_VERTEX_INDEXED
+        self.reduced_faces = coin.SoIndexedFaceSet()
+        self.reduced_detail.addChild(self.reduced_coords)
+        self.reduced_detail.addChild(self.reduced_normals)
+        self.reduced_detail.addChild(reduced_normal_binding)
+        self.reduced_detail.addChild(self.reduced_faces)
+
+        self.polyline_detail = coin.SoSeparator()
+        self.polyline_detail.addChild(self.main_material)
+        light_model = coin.SoLightModel()
+        light_model.model = coin.SoLightModel.BASE_COLOR
+        self.polyline_detail.addChild(light_model)
+        draw_style = coin.SoDrawStyle()
+        draw_style.lineWidth = 2.0
+        self.polyline_detail.addChild(draw_style)
+        self.polyline_coords = coin.SoCoordinate3()
+        self.polyline_lines = coin.SoLineSet()
+        self.polyline_detail.addChild(self.polyline_coords)
+        self.polyline_detail.addChild(self.polyline_lines)
+
+        # the wireframe display mode is the polyline level of detail, with
+        # markers at both ends of each stitch of intermittent welds
+        self.stitch_markers = coin.SoSeparator()
+        self.stitch_marker_coords = coin.SoCoordinate3()
+        self.stitch_marker_set = coin.SoMarkerSet()
+        self.stitch_marker_set.markerIndex = coin.SoMarkerSet.CIRCLE_FILLED_7_7
+        self.stitch_markers.addChild(self.main_material)
+        self.stitch_markers.addChild(self.stitch_marker_coords)
+        self.stitch_markers.addChild(self.stitch_marker_set)
+        self.wireframe_display_group.addChild(self.polyline_detail)
+        self.wireframe_display_group.addChild(self.stitch_markers)
+
+        # both shaded display modes share their reduced levels of detail
+        self.shaded_lod = coin.SoLOD()
+        self.tube_lod = coin.SoLOD()
+        for lod, full_detail in (
+            (self.shaded_lod, self.full_detail),
+            (self.tube_lod, self.tube_full_detail),
+        ):
+            lod.addChild(full_detail)
+            lod.addChild(self.reduced_detail)
+            lod.addChild(self.polyline_detail)
+        self.default_display_group.addChild(self.shaded_lod)
+        self.tube_display_group.addChild(self.tube_lod)
+
+        # the groups each shared node is a child of
+        self._shared_parents = {
+            "main_material": [
+                self.start_and_end_caps,
+                self.intermediate_spheres,
+                self.main_intermediate_cylinders,
+                self.reduced_detail,
+                self.polyline_detail,
+                self.stitch_markers,
+            ],
+            "alt_material": [self.alt_intermediate_cylinders],
+            "tube_material": [self.tube_mesh],
+            "sphere": [self.copies_of_spheres],
+            "intermediate_cyl": [self.copies_of_cyls, self.alt_copies_of_cyls],
+            "endcap": [self.copies_of_endcaps],
+        }
+
+        # parts of the scene graph that are out of date
+        self._dirty = set()
+        self._path_fingerprint = None
+
+    def _invalidate(self, fp, *parts):
+        """Mark parts of the scene graph as out of date, then bring everything
+        that can be updated up to date"""
+        self._dirty.update(parts)
+        with tracing.span("update_scene_graph", weld=fp.Name):
+            self._refresh(fp)
+
+    def _refresh(self, fp):
+        if MATERIALS in self._dirty:
+            self._set_geom_colors(fp.ViewObject)
+            self._dirty.discard(MATERIALS)
+        if RADIUS in self._dirty:
+            size = float(fp.WeldSize.getValueAs("mm"))
+            self._use_shared_node("sphere", *_sphere(0.99 * size))
+            self._use_shared_node("intermediate_cyl", *_cylinder(size))
+            self._dirty.discard(RADIUS)
+        if CAP_SHAPE in self._dirty:
+            size = float(fp.WeldSize.getValueAs("mm"))
+            self._use_shared_node("endcap", *_endcap(fp.ViewObject.EndCapStyle, size))
+            self._dirty.discard(CAP_SHAPE)
+        # everything else is built from the vertices of the feature
+        if getattr(fp.Proxy, "_vertices", None) is None:
+            return
+        if PATH in self._dirty:
+            self._setup_weld_bead(fp)
+            self._update_polylines(fp)
+            self._dirty.discard(PATH)
+        if LEVEL_OF_DETAIL in self._dirty:
+            self._update_level_of_detail(fp)
+            self._dirty.discard(LEVEL_OF_DETAIL)
+        # the tube mesh is only kept up to date while it is displayed
+        if TUBE in self._dirty and fp.ViewObject.DisplayMode == "Tube":
+            self._update_tube_mesh(fp)
+            self._dirty.discard(TUBE)
+
+    def _use_shared_node(self, slot, key, factory):
+        """Point the attribute slot at the shared node for key, replacing the
+        node previously used for slot everywhere in the scene graph. Shared
+        nodes are released when the view provider is garbage collected, not
+        when its object is deleted, since undoing a deletion reuses it"""
+        old_key = self._shared_keys.get(slot)
+        if old_key == key:
+            return
+        node = shared_nodes.registry.acquire(key, factory)
+        # the node currently in the scene graph is swapped out whether or not
+        # its key is still recorded
+        old_node = getattr(self, slot, None)
+        if old_node is not None:
+            for parent in self._shared_parents.get(slot, ()):
+                parent.replaceChild(old_node, node)
+        if old_key is not None:
+            shared_nodes.registry.release(old_key)
+        setattr(self, slot, node)
+        self._shared_keys[slot] = key
 
     def _set_geom_colors(self, vobj):
-        self.main_material.diffuseColor = vobj.ShapeColor[:3]
+        main_color = vobj.ShapeColor[:3]
         if vobj.DrawWithAlternatingColors:
-            self.alt_material.diffuseColor = vobj.AlternatingColor[:3]
+            alt_color = vobj.AlternatingColor[:3]
         else:
-            self.alt_material.diffuseColor = vobj.ShapeColor[:3]
+            alt_color = main_color
+        self._use_shared_node("main_material", *_material(main_color))
+        self._use_shared_node("alt_material", *_material(alt_color))
+        self._use_shared_node("tube_material", *_material(main_color, alt_color))
+
+    @tracing.traced("update_tube_mesh")
+    def _update_tube_mesh(self, fp):
+        polylines = fp.Proxy._vertices
+        radius = float(fp.WeldSize.getValueAs("mm"))
+        coordinates, normals, faces, face_parity = tube_mesh(polylines, radius)
+        _set_indexed_mesh(
+            self.tube_coords,
+            self.tube_normals,
+            self.tube_faces,
+            coordinates,
+            normals,
+            faces,
+        )
+        self.tube_faces.materialIndex.setNum(len(faces))
+        if len(faces):
+            self.tube_faces.materialIndex.setValues(0, len(faces), face_parity.tolist())
+
+    @tracing.traced("update_level_of_detail")
+    def _update_level_of_detail(self, fp):
+        polylines = fp.Proxy._vertices
+        size = float(fp.WeldSize.getValueAs("mm"))
+        points = polylines.points
+        # switch levels by distance from the center of the weld. The ranges
+        # grow with the bead size, since thicker beads stay visible from further
+        # away, and with the size of the weld, so that a long weld isn't reduced
+        # while the camera is still close to part of it
+        if len(points):
+            lower, upper = points.min(axis=0), points.max(axis=0)
+            center = 0.5 * (lower + upper)
+            half_diagonal = 0.5 * float(np.linalg.norm(upper - lower))
+        else:
+            center, half_diagonal = np.zeros(3), 0.0
+        ranges = [half_diagonal + 200.0 * size, half_diagonal + 2000.0 * size]
+        for lod in (self.shaded_lod, self.tube_lod):
+            lod.center.setValue(coin.SbVec3f(*center.tolist()))
+            lod.range.setValues(0, 2, ranges)
+
+        coarse = polylines.decimate(10.0 * size)
+        coordinates, normals, faces, _ = tube_mesh(coarse, size, sides=6)
+        _set_indexed_mesh(
+            self.reduced_coords,
+            self.reduced_normals,
+            self.reduced_faces,
+            coordinates,
+            normals,
+            faces,
+        )
 
-    def _adjust_endcaps(self, fp):
-        vertex_list = fp.Proxy._vertex_list
-        if not vertex_list:
-            return
-        self.copies_of_endcaps.removeAllChildren()
-        cap_size = float(fp.WeldSize.getValueAs("mm"))
-        match fp.ViewObject.EndCapStyle:
-            case "Flat":
-                cap_shape = coin.SoCylinder()
-                cap_shape.radius.setValue(cap_size)
-                cap_shape.height.setValue(0.0)
-                cap_shape.parts.setValue(coin.SoCylinder.TOP)
-            case "Rounded":
-                cap_shape = coin.SoSphere()
-                cap_shape.radius.setValue(cap_size)
-            case "Pointed":
-                cone = coin.SoCone()
-                cone.bottomRadius.setValue(cap_size)
-                cone.height.setValue(cap_size)
-                cone.parts.setValue(coin.SoCone.SIDES)
-                translate = coin.SoTranslation()
-                translate.translation.setValue(coin.SbVec3f(0.0, 0.5 * cap_size, 0.0))
-                cap_shape = coin.SoSeparator()
-                cap_shape.addChild(translate)
-                cap_shape.addChild(cone)
-
-        self.copies_of_endcaps.addChild(cap_shape)
-        cap_matrix_list = []
-        for sublist in vertex_list:
-            startcap_base = sublist[0]
-            endcap_base = sublist[-1]
-            startcap_dir = (startcap_base - sublist[1]).normalize()
-            endcap_dir = (endcap_base - sublist[-2]).normalize()
-            primitive_axis = FreeCAD.Vector(0.0, 1.0, 0.0)
-
-            startcap_rot_axis = coin.SbVec3f(*primitive_axis.cross(startcap_dir))
-            endcap_rot_axis = coin.SbVec3f(*primitive_axis.cross(endcap_dir))
-            startcap_rot_angle = math.acos(primitive_axis.dot(startcap_dir))
-            endcap_rot_angle = math.acos(primitive_axis.dot(endcap_dir))
-
-            startcap_mat = coin.SbMatrix()
-            startcap_mat.setTransform(
-                coin.SbVec3f(*startcap_base),  # translation
-                coin.SbRotation(startcap_rot_axis, startcap_rot_angle),  # rotation
-                coin.SbVec3f(1.0, 1.0, 1.0),  # scale
+    @tracing.traced("update_polylines")
+    def _update_polylines(self, fp):
+        polylines = fp.Proxy._vertices
+        points = polylines.points
+        self.polyline_coords.point.setNum(len(points))
+        if len(points):
+            self.polyline_coords.point.setValues(0, len(points), points.tolist())
+        counts = np.diff(polylines.offsets)
+        self.polyline_lines.numVertices.setNum(len(counts))
+        if len(counts):
+            self.polyline_lines.numVertices.setValues(0, len(counts), counts.tolist())
+
+        if fp.IntermittentWeld and len(counts):
+            nonempty = counts > 0
+            stitch_ends = np.concatenate(
+                [
+                    points[polylines.offsets[:-1][nonempty]],
+                    points[polylines.offsets[1:][nonempty] - 1],
+                ]
             )
-            endcap_mat = coin.SbMatrix()
-            endcap_mat.setTransform(
-                coin.SbVec3f(*endcap_base),  # translation
-                coin.SbRotation(endcap_rot_axis, endcap_rot_angle),  # rotation
-                coin.SbVec3f(1.0, 1.0, 1.0),  # scale
+        else:
+            stitch_ends = np.empty((0, 3))
+        self.stitch_marker_coords.point.setNum(len(stitch_ends))
+        if len(stitch_ends):
+            self.stitch_marker_coords.point.setValues(
+                0, len(stitch_ends), stitch_ends.tolist()
             )
-            cap_matrix_list.extend([startcap_mat, endcap_mat])
 
-        endcap_matrices = coin.SoMFMatrix()
-        endcap_matrices.setNum(len(cap_matrix_list))
-        for i, mat in enumerate(cap_matrix_list):
-            endcap_matrices.set1Value(i, mat)
-        self.copies_of_endcaps.matrix = endcap_matrices
+    @tracing.traced("position_endcaps")
+    def _position_endcaps(self, polylines):
+        # caps sit on the first and last point of each polyline, and point away
+        # from the second and second to last points
+        starts = polylines.offsets[:-1]
+        ends = polylines.offsets[1:] - 1
+        long_enough = ends > starts
+        starts, ends = starts[long_enough], ends[long_enough]
+        points = polylines.points
+        cap_bases = np.concatenate([points[starts], points[ends]])
+        cap_directions = np.concatenate(
+            [points[starts] - points[starts + 1], points[ends] - points[ends - 1]]
+        )
+        _set_matrices(
+            self.copies_of_endcaps.matrix,
+            coin_transform_matrices(cap_bases, cap_directions),
+        )
 
+    @tracing.traced("setup_weld_bead")
     def _setup_weld_bead(self, fp):
-        superlist_of_vertices = fp.Proxy._vertex_list
-        if not superlist_of_vertices:
-            return
-        sph_mat_list = []
-        main_cyl_mat_list = []
-        alt_cyl_mat_list = []
-        for vertices in superlist_of_vertices:
-            for i, vert in enumerate(vertices):
-                if (i != 0) and (i != len(vertices) - 1):
-                    # don't show the sphere when the next, current, and last points
-                    # are nearly colinear
-                    x = (vert - vertices[i - 1]).getAngle(
-                        vertices[i + 1] - vert
-                    ) / math.pi
-                    if x > 1e-3:
-                        mat = coin.SbMatrix()
-                        mat.setTranslate(coin.SbVec3f(*vert))
-                        sph_mat_list.append(mat)
-                if i != len(vertices) - 1:
-                    v2next = vertices[i] - vertices[i + 1]
-                    # cylinders are created concentric to the Y-Axis
-                    cyl_axis = FreeCAD.Vector(0.0, 1.0, 0.0)
-                    cyl_rotation_axis = coin.SbVec3f(*cyl_axis.cross(v2next))
-                    cyl_rotation_angle = math.acos(
-                        cyl_axis.dot(v2next) / (cyl_axis.Length * v2next.Length)
-                    )
-                    mat2 = coin.SbMatrix()
-                    mat2.setTransform(
-                        coin.SbVec3f(*(vert - 0.5 * v2next)),  # translation
-                        coin.SbRotation(
-                            cyl_rotation_axis, cyl_rotation_angle
-                        ),  # rotation
-                        coin.SbVec3f(1.0, v2next.Length, 1.0),  # scale
-                    )
-                    if not i % 2:
-                        main_cyl_mat_list.append(mat2)
-                    else:
-                        alt_cyl_mat_list.append(mat2)
-
-        spheres_matrices = coin.SoMFMatrix()
-        spheres_matrices.setNum(len(sph_mat_list))
-        for i, mat in enumerate(sph_mat_list):
-            spheres_matrices.set1Value(i, mat)
-        self.copies_of_spheres.matrix = spheres_matrices
-
-        cyls_main_matrices = coin.SoMFMatrix()
-        cyls_main_matrices.setNum(len(main_cyl_mat_list))
-        for i, mat in enumerate(main_cyl_mat_list):
-            cyls_main_matrices.set1Value(i, mat)
-        self.copies_of_cyls.matrix = cyls_main_matrices
-
-        cyls_alt_matrices = coin.SoMFMatrix()
-        cyls_alt_matrices.setNum(len(alt_cyl_mat_list))
-        for i, mat in enumerate(alt_cyl_mat_list):
-            cyls_alt_matrices.set1Value(i, mat)
-        self.alt_copies_of_cyls.matrix = cyls_alt_matrices
-        # also need to change the endcaps
-        self._adjust_endcaps(fp)
+        polylines = fp.Proxy._vertices
+        points = polylines.points
+        offsets = polylines.offsets
+        segment_mask = polylines.segment_mask()
+        segment_index = np.flatnonzero(segment_mask)
+        # cylinders are created concentric to the Y-Axis, and are scaled and
+        # rotated to span each segment
+        v2next = points[segment_index] - points[segment_index + 1]
+        lengths = np.linalg.norm(v2next, axis=1)
+        scales = np.ones((len(segment_index), 3))
+        scales[:, 1] = lengths
+        cylinder_matrices = coin_transform_matrices(
+            points[segment_index] - 0.5 * v2next, v2next, scales
+        )
+        # colors alternate along each polyline, starting with the main color
+        polyline_index = np.searchsorted(offsets, segment_index, side="right") - 1
+        is_main = (segment_index - offsets[polyline_index]) % 2 == 0
+        _set_matrices(self.copies_of_cyls.matrix, cylinder_matrices[is_main])
+        _set_matrices(self.alt_copies_of_cyls.matrix, cylinder_matrices[~is_main])
+
+        # spheres fill the gaps at interior vertices, but aren't shown when the
+        # next, current, and last points are nearly colinear
+        is_interior = segment_mask[:-1] & segment_mask[1:]
+        incoming = np.diff(points, axis=0)[:-1][is_interior]
+        outgoing = np.diff(points, axis=0)[1:][is_interior]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cosines = np.einsum("ij,ij->i", incoming, outgoing) / (
+                np.linalg.norm(incoming, axis=1) * np.linalg.norm(outgoing, axis=1)
+            )
+        angles = np.arccos(np.clip(np.nan_to_num(cosines, nan=1.0), -1.0, 1.0))
+        corners = points[1:-1][is_interior][angles / math.pi > 1e-3]
+        sphere_matrices = np.tile(np.eye(4), (len(corners), 1, 1))
+        sphere_matrices[:, 3, :3] = corners
+        _set_matrices(self.copies_of_spheres.matrix, sphere_matrices)
+        # also need to move the endcaps
+        self._position_endcaps(polylines)
+
+
+def _release_shared_nodes(shared_keys):
+    for key in shared_keys.values():
+        shared_nodes.registry.release(key)
+    shared_keys.clear()
+
+
+# each of these returns a (key, factory) pair for a shared node
+def _material(*colors):
+    return (
+        shared_nodes.material_key(*colors),
+        lambda: shared_nodes.make_material(*colors),
+    )
+
+
+def _sphere(radius):
+    return shared_nodes.sphere_key(radius), lambda: shared_nodes.make_sphere(radius)
+
+
+def _cylinder(radius):
+    return (
+        shared_nodes.cylinder_key(radius),
+        lambda: shared_nodes.make_cylinder(radius),
+    )
+
+
+def _endcap(style, size):
+    return (
+        shared_nodes.endcap_key(style, size),
+        lambda: shared_nodes.make_endcap(style, size),
+    )
+
+
+def _tube_shape_hints() -> coin.SoShapeHints:
+    hints = coin.SoShapeHints()
+    hints.vertexOrdering = coin.SoShapeHints.COUNTERCLOCKWISE
+    # tubes are open at their ends, so both sides of the faces must be lit
+    hints.shapeType = coin.SoShapeHints.UNKNOWN_SHAPE_TYPE
+    return hints
+
+
+def _set_indexed_mesh(coords, normals, face_set, coordinates, vertex_normals, faces):
+    """Replace the contents of the nodes of an indexed mesh of quads"""
+    coords.point.setNum(len(coordinates))
+    normals.vector.setNum(len(vertex_normals))
+    face_set.coordIndex.setNum(5 * len(faces))
+    if not len(faces):
+        return
+    coords.point.setValues(0, len(coordinates), coordinates.tolist())
+    normals.vector.setValues(0, len(vertex_normals), vertex_normals.tolist())
+    # each face is a quad, terminated by -1
+    coord_index = np.hstack([faces, np.full((len(faces), 1), -1)])
+    face_set.coordIndex.setValues(0, coord_index.size, coord_index.ravel().tolist())
+
+
+def _set_matrices(field: coin.SoMFMatrix, matrices: np.ndarray):
+    """Replace the contents of an SoMFMatrix field with an (n, 4, 4) array"""
+    field.setNum(len(matrices))
+    if not len(matrices):
+        return
+    try:
+        field.setValues(0, len(matrices), matrices.tolist())
+    except TypeError:
+        # older pivy versions can't convert nested sequences to matrices in bulk
+        for i, mat in enumerate(matrices.tolist()):
+            field.set1Value(i, coin.SbMatrix(mat))
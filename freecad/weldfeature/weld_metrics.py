@@ -0,0 +1,84 @@
+import collections
+import math
+import numpy as np
+
+# quantities derived from the length of a weld. Units are millimeters, kilograms
+# and seconds, to match the internal units of FreeCAD
+WeldMetrics = collections.namedtuple(
+    "WeldMetrics", ["length", "area", "volume", "mass", "arc_time"]
+)
+
+
+def stitch_count(path_length, stitch_length, pitch, offset) -> int:
+    """Closed form count of the stitches of an intermittent weld along a path.
+    Stitches start at offset, offset + pitch, offset + 2 * pitch... and only
+    stitches that end before the end of the path are counted"""
+    available = path_length - stitch_length - offset
+    if available <= 0.0:
+        return 0
+    if pitch <= 0.0:
+        # every stitch would lie on top of the first one
+        return 1
+    return math.ceil(available / pitch)
+
+
+def stitch_intervals(
+    path_length, stitch_length, pitch, offset, layout="Offset"
+) -> np.ndarray:
+    """Closed form placement of the stitches of an intermittent weld. Returns an
+    (n, 2) array of the start and end distance of each stitch along the path.
+
+    layout is one of:
+    - "Offset": stitches start at offset, and repeat every pitch
+    - "Centered": as many stitches as fit, centered on the path. offset is ignored
+    - "Both Ends": stitches start and end flush with the ends of the path. The
+      pitch is reduced as needed to fit a whole number of stitches
+    With "Centered" and "Both Ends", a path shorter than one stitch is welded
+    along its whole length"""
+    if layout == "Offset":
+        starts = offset + pitch * np.arange(
+            stitch_count(path_length, stitch_length, pitch, offset)
+        )
+    elif path_length <= stitch_length:
+        return np.array([[0.0, max(path_length, 0.0)]])
+    elif layout == "Centered":
+        count = 1 if pitch <= 0.0 else (path_length - stitch_length) // pitch + 1
+        span = (count - 1) * pitch + stitch_length
+        starts = 0.5 * (path_length - span) + pitch * np.arange(count)
+    elif layout == "Both Ends":
+        if pitch <= 0.0:
+            count = 2
+        else:
+            count = math.ceil((path_length - stitch_length) / pitch) + 1
+        starts = np.linspace(0.0, path_length - stitch_length, count)
+    else:
+        raise ValueError(f"Unknown intermittent weld layout: {layout}")
+    starts = np.asarray(starts, dtype=np.float64)
+    return np.column_stack([starts, starts + stitch_length])
+
+
+def welded_length(path_length, intermittent_parameters=None) -> float:
+    """The exact length of weld deposited along a path of connected edges.
+    intermittent_parameters is None for continuous welds, or a tuple of
+    (stitch_length, pitch, offset[, layout])"""
+    if intermittent_parameters is None:
+        return path_length
+    intervals = stitch_intervals(path_length, *intermittent_parameters)
+    return float((intervals[:, 1] - intervals[:, 0]).sum())
+
+
+def fillet_area(leg_size) -> float:
+    """Cross-section area of an equal leg fillet weld, without reinforcement.
+    The weld feature passes its WeldSize as the leg size, so this is not the
+    cross-section of the tube that is drawn for the bead"""
+    return 0.5 * leg_size * leg_size
+
+
+def weld_metrics(length, leg_size, density, deposition_rate) -> WeldMetrics:
+    """density is in kg/mm^3, and deposition_rate in kg/s. Arc time is zero
+    if no deposition rate is given"""
+    area = fillet_area(leg_size)
+    volume = area * length
+    mass = volume * density
+    arc_time = mass / deposition_rate if deposition_rate > 0.0 else 0.0
+    return WeldMetrics(length, area, volume, mass, arc_time)
@@ -0,0 +1,99 @@
+import csv
+import json
+import os
+from .weldfeature import WeldFeature
+
+# columns of the weld report, in order. Lengths are in mm, volumes in mm^3,
+# masses in kg and times in s
+REPORT_COLUMNS = [
+    "name",
+    "label",
+    "base_objects",
+    "weld_size",
+    "weld_length",
+    "intermittent_weld",
+    "intermittent_weld_length",
+    "intermittent_weld_pitch",
+    "intermittent_weld_offset",
+    "intermittent_weld_layout",
+    "field_weld",
+    "all_around",
+    "alternating_weld",
+    "deposit_volume",
+    "filler_mass",
+    "arc_time",
+]
+
+
+def is_weld_feature(obj) -> bool:
+    return isinstance(getattr(obj, "Proxy", None), WeldFeature)
+
+
+def _stored_value(obj, name):
+    # metric properties are missing from objects that haven't been restored by
+    # a version that knows about them
+    value = getattr(obj, name, None)
+    return None if value is None else value.Value
+
+
+def iter_weld_rows(doc):
+    """Yield one dict per weld feature in the document, in document order. Only
+    the stored property values are read, so no weld is touched or recomputed"""
+    for obj in doc.Objects:
+        if not is_weld_feature(obj):
+            continue
+        base_objects = dict.fromkeys(base.Name for base, _ in obj.Base)
+        yield {
+            "name": obj.Name,
+            "label": obj.Label,
+            "base_objects": ";".join(base_objects),
+            "weld_size": obj.WeldSize.Value,
+            "weld_length": obj.WeldLength.Value,
+            "intermittent_weld": obj.IntermittentWeld,
+            "intermittent_weld_length": obj.IntermittentWeldLength.Value,
+            "intermittent_weld_pitch": obj.IntermittentWeldPitch.Value,
+            "intermittent_weld_offset": obj.IntermittentWeldOffset.Value,
+            "intermittent_weld_layout": getattr(
+                obj, "IntermittentWeldLayout", "Offset"
+            ),
+            "field_weld": obj.FieldWeld,
+            "all_around": obj.AllAround,
+            "alternating_weld": obj.AlternatingWeld,
+            "deposit_volume": _stored_value(obj, "DepositVolume"),
+            "filler_mass": _stored_value(obj, "FillerMass"),
+            "arc_time": _stored_value(obj, "ArcTime"),
+        }
+
+
+def write_csv(rows, stream) -> int:
+    """Write rows to a text stream as CSV, one at a time. Returns the number of
+    rows written"""
+    writer = csv.DictWriter(stream, fieldnames=REPORT_COLUMNS)
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_json(rows, stream) -> int:
+    """Write rows to a text stream as a JSON array, one at a time. Returns the
+    number of rows written"""
+    stream.write("[")
+    count = 0
+    for row in rows:
+        stream.write(",\n" if count else "\n")
+        stream.write(json.dumps(row))
+        count += 1
+    stream.write("\n]\n")
+    return count
+
+
+def write_report(doc, path) -> int:
+    """Write a report of every weld in doc to path. The format is chosen by the
+    file extension: .json for JSON, and CSV otherwise. Returns the number of
+    welds reported"""
+    writer = write_json if os.path.splitext(path)[1].lower() == ".json" else write_csv
+    with open(path, "w", newline="", encoding="utf-8") as stream:
+        return writer(iter_weld_rows(doc), stream)
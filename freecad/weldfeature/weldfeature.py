@@ -1,9 +1,37 @@
-from itertools import starmap
+import collections
+import math
 import FreeCAD
 import Part
-from .geom_utils import discretize_list_of_edges
+from .geom_utils import PolylineArray
+from .geom_utils import discretize_edges
+from .geom_utils import discretize_edges_adaptive
 from .geom_utils import discretize_intermittent
+from .geom_utils import sweep_polylines
+from .geometry_cache import PARAMETER_PATH
+from .geometry_cache import LRUCache
+from .geometry_cache import geometry_fingerprint
+from . import tracing
+from .tangent_edges import ShapeSnapshot
 from .tangent_edges import expand_selection_to_geometry
+from .weld_metrics import weld_metrics
+from .weld_metrics import welded_length
+
+# everything needed to discretize a weld, detached from the document object
+WeldParameters = collections.namedtuple(
+    "WeldParameters",
+    ["selection", "propagate", "bead_size", "intermittent_parameters", "adaptive"],
+)
+
+
+class DiscretizedWeld(
+    collections.namedtuple("DiscretizedWeld", ["vertices", "length"])
+):
+    """The polylines of a weld (or of a part of it), and the exact length of weld
+    material that they represent"""
+
+    @property
+    def nbytes(self) -> int:
+        return self.vertices.nbytes
 
 
 class WeldFeature:
@@ -82,24 +110,117 @@ class WeldFeature:
             "Computed Length of weld material in this weld object",
         )
         obj.setPropertyStatus("WeldLength", "ReadOnly")
+        self._add_missing_properties(obj)
+        self._set_output_property_status(obj)
+
+        self._vertices = PolylineArray()
+        self._weld_length = 0.0
 
-        self._vertex_list = []
+    @property
+    def _vertex_list(self):
+        """compatibility accessor: the discretized weld as a nested list of
+        FreeCAD.Vector, one sublist per polyline. Prefer self._vertices"""
+        return self._vertices.to_vectors()
+
+    @_vertex_list.setter
+    def _vertex_list(self, value):
+        self._vertices = PolylineArray.from_polylines(value)
 
     def execute(self, obj):
-        pass
+        # property changes only touch the object, so that any number of edits
+        # cost a single discretization when the document is recomputed
+        params = FreeCAD.ParamGet(PARAMETER_PATH)
+        with tracing.span("execute", weld=obj.Name):
+            if FreeCAD.GuiUp and params.GetBool("AsyncRecompute", False):
+                self._recompute_vertices_async(obj)
+            else:
+                self._recompute_vertices(obj)
+                self._update_metrics(obj)
+
+    def onDocumentRestored(self, obj):
+        if hasattr(obj, "Shape"):
+            # saved by a development version that stored the solid weld bead
+            obj.removeProperty("Shape")
+        self._add_missing_properties(obj)
+        self._set_output_property_status(obj)
+
+    def _add_missing_properties(self, obj):
+        """Add properties introduced after the first release. Called for new
+        objects, and for objects restored from documents saved by older versions
+        """
+        if not hasattr(obj, "DiscretizationMode"):
+            obj.addProperty(
+                "App::PropertyEnumeration",
+                "DiscretizationMode",
+                "Weld",
+                "How points are placed along continuous welds. 'Uniform' spaces "
+                "them by the weld size, 'Adaptive' places them by curvature",
+            )
+            obj.DiscretizationMode = ["Uniform", "Adaptive"]
+        if not hasattr(obj, "IntermittentWeldLayout"):
+            obj.addProperty(
+                "App::PropertyEnumeration",
+                "IntermittentWeldLayout",
+                "Weld",
+                "How stitches are placed along intermittent welds. 'Offset' starts "
+                "them at IntermittentWeldOffset, 'Centered' centers them on the "
+                "edges, 'Both Ends' reduces the pitch so that stitches end flush "
+                "with both ends of the edges",
+            )
+            obj.IntermittentWeldLayout = ["Offset", "Centered", "Both Ends"]
+            obj.setPropertyStatus(
+                "IntermittentWeldLayout", "-" * int(obj.IntermittentWeld) + "Hidden"
+            )
+        if not hasattr(obj, "FillerDensity"):
+            obj.addProperty(
+                "App::PropertyDensity",
+                "FillerDensity",
+                "WeldInformation",
+                "Density of the filler material, used to estimate the filler mass",
+            )
+            obj.FillerDensity = FreeCAD.Units.Quantity("7850 kg/m^3")
+        if not hasattr(obj, "DepositionRate"):
+            obj.addProperty(
+                "App::PropertyFloat",
+                "DepositionRate",
+                "WeldInformation",
+                "Mass of filler material deposited per hour of arc time, in kg/h. "
+                "Used to estimate the arc time",
+            )
+            obj.DepositionRate = 2.0
+        # computed metrics
+        for property_type, name, description in [
+            (
+                "App::PropertyArea",
+                "FilletArea",
+                "Cross-section area of the weld, taken as an equal leg fillet "
+                "with WeldSize as the leg length. The bead shown in the 3D view "
+                "is only a tube of radius WeldSize, not this cross-section",
+            ),
+            (
+                "App::PropertyVolume",
+                "DepositVolume",
+                "Volume of deposited weld, from FilletArea and WeldLength",
+            ),
+            ("App::PropertyMass", "FillerMass", "Mass of filler material"),
+            ("App::PropertyTime", "ArcTime", "Estimated arc time"),
+        ]:
+            if not hasattr(obj, name):
+                obj.addProperty(property_type, name, "WeldInformation", description)
+                obj.setPropertyStatus(name, "ReadOnly")
+        if not hasattr(obj, "ShapeOutput"):
+            obj.addProperty(
+                "App::PropertyBool",
+                "ShapeOutput",
+                "Output",
+                "Whether to provide a solid weld bead to other workbenches, "
+                "through Part.getShape. It is built when first requested, which "
+                "can be slow for long welds",
+            )
 
     def onChanged(self, obj, prop: str):
-        non_informational_properties = [
-            "Base",
-            "PropagateSelection",
-            "WeldSize",
-            "IntermittentWeld",
-            "IntermittentWeldPitch",
-            "IntermittentWeldLength",
-            "IntermittentWeldOffset",
-        ]
-        if prop in non_informational_properties:
-            self._recompute_vertices(obj)
+        # Changes to the properties that define the weld geometry touch the object.
+        # The geometry itself is rebuilt in execute()
         if prop == "IntermittentWeld":
             # when not using an intermittent weld,
             # hide visibility of associated properties
@@ -107,8 +228,12 @@ class WeldFeature:
                 "IntermittentWeldPitch",
                 "IntermittentWeldLength",
                 "IntermittentWeldOffset",
+                "IntermittentWeldLayout",
             ]
             for property_name in dependant_properties:
+                if not hasattr(obj, property_name):
+                    # not yet added while an older document is being restored
+                    continue
                 # prepend a '-' (E.G.: "-Hidden") to clear the status bit
                 obj.setPropertyStatus(
                     property_name, "-" * int(obj.IntermittentWeld) + "Hidden"
@@ -116,86 +241,269 @@ class WeldFeature:
 
     def dumps(self):
         return {
-            "_vertex_list": [
-                [tuple(x) for x in sublist] for sublist in self._vertex_list
-            ],
+            "_vertices": self._vertices.points.tolist(),
+            "_offsets": self._vertices.offsets.tolist(),
             "_weld_length": self._weld_length,
         }
 
     def loads(self, state: dict):
-        self._vertex_list = [
-            [FreeCAD.Vector(x) for x in sublist]
-            for sublist in state.get("_vertex_list", [])
-        ]
+        if "_vertices" in state:
+            self._vertices = PolylineArray(state["_vertices"], state["_offsets"])
+        else:
+            # documents saved by older versions store a nested list of points
+            self._vertices = PolylineArray.from_polylines(state.get("_vertex_list", []))
         self._weld_length = state.get("_weld_length", 0.0)
         return None
 
     def _recompute_vertices(self, obj):
-        """Call this as little as possible to save compute time"""
+        """Call this as little as possible to save compute time.
+        Only execute() should need to"""
+        with tracing.span("recompute_vertices", weld=obj.Name):
+            parameters = self._collect_parameters(obj)
+            if parameters is None:
+                return
+            result = self._compute_vertices(parameters)
+            if result is not None:
+                self._vertices, self._weld_length = result
+
+    def _recompute_vertices_async(self, obj):
+        """Like _recompute_vertices, but the selection is expanded and discretized
+        in a background thread. The previous geometry stays in place until the
+        result arrives. Results of computations that were superseded by a later
+        call are dropped"""
+        from . import async_recompute
+
+        parameters = self._collect_parameters(obj, detached=True)
+        if parameters is None:
+            return
+        # preferences are read here, as the worker must not touch the document,
+        # the parameter manager or the document observers
+        _get_group_cache()
+        trace_settings = tracing.read_settings()
+
+        name = obj.Name
+
+        def work():
+            with tracing.span("compute_vertices", weld=name, settings=trace_settings):
+                return self._compute_vertices(parameters)
+
+        def apply_result(result):
+            try:
+                obj.Document
+            except ReferenceError:
+                return  # the object was deleted in the meantime
+            with tracing.span("apply_result", weld=name):
+                if result is not None:
+                    self._vertices, self._weld_length = result
+                # this also makes the view provider redraw the weld bead
+                self._update_metrics(obj)
+
+        async_recompute.submit((obj.Document.Name, name), work, apply_result)
+
+    def _collect_parameters(self, obj, detached=False):
+        """Read everything needed to compute the weld from the document object.
+        With detached=True, the referenced shapes are deep copied so that the
+        result only holds plain data, which can be used away from the GUI thread.
+        Returns None if the weld can't be computed"""
         bead_size = float(obj.WeldSize.getValueAs("mm"))
         if bead_size < 1e-1:
             FreeCAD.Console.PrintUserError(
                 "Weld sizes of less than 0.1mm are not supported\n"
             )
-            return
+            return None
         # this should be a list of tuples, something like:
         # [(<obj001>, ['Edge1', 'Edge2']), (<obj002>, ['Edge1', 'Edge3'])]
         geom_selection = obj.Base
-
-        if not geom_selection:
-            self._vertex_list = []
-            return
-        unsorted_edges = expand_selection_to_geometry(
-            geom_selection, obj.PropagateSelection
+        if detached:
+            geom_selection = [
+                (ShapeSnapshot(base_object), subelement_names)
+                for base_object, subelement_names in geom_selection
+                if hasattr(base_object, "Shape")
+            ]
+        if obj.IntermittentWeld:
+            intermittent_parameters = (
+                float(obj.IntermittentWeldLength.getValueAs("mm")),
+                float(obj.IntermittentWeldPitch.getValueAs("mm")),
+                float(obj.IntermittentWeldOffset.getValueAs("mm")),
+                obj.IntermittentWeldLayout,
+            )
+        else:
+            intermittent_parameters = None
+        return WeldParameters(
+            geom_selection,
+            obj.PropagateSelection,
+            bead_size,
+            intermittent_parameters,
+            obj.DiscretizationMode == "Adaptive",
         )
+
+    def _compute_vertices(self, parameters: WeldParameters):
+        """Returns a DiscretizedWeld, or None if the geometry can't be computed
+        right now. Doesn't touch the document object, so this is safe to call
+        from a background thread when given detached parameters"""
+        if not parameters.selection:
+            return DiscretizedWeld(PolylineArray(), 0.0)
+        with tracing.span("expand_selection_to_geometry") as counts:
+            unsorted_edges = expand_selection_to_geometry(
+                parameters.selection, parameters.propagate
+            )
+            counts["edges"] = len(unsorted_edges)
         # when restoring documents, all edges may briefly be null for some reason
         amount_of_null_shapes = len(
             [x for x in [edge.isNull() for edge in unsorted_edges] if x]
         )
         if amount_of_null_shapes == len(unsorted_edges):
-            return
-        sorted_edges = Part.sortEdges(unsorted_edges)
-
-        lists_of_vertexes = []
+            return None
+        with tracing.span("sortEdges") as counts:
+            sorted_edges = Part.sortEdges(unsorted_edges)
+            counts["groups"] = len(sorted_edges)
 
         # TODO: this will cause errors with objects in differing geofeature groups
-        if obj.IntermittentWeld:
-            for edge_group in sorted_edges:
-                lists_of_vertexes.extend(
+        # the final vertex list is a set of polylines, each of which is a smooth
+        # discretization of multiple connected edges
+        with tracing.span("discretize") as counts:
+            groups = [
+                self._discretize_edge_group(edge_group, parameters)
+                for edge_group in sorted_edges
+            ]
+            vertices = PolylineArray.concatenate(x.vertices for x in groups)
+            counts["polylines"] = len(vertices)
+            counts["points"] = len(vertices.points)
+        return DiscretizedWeld(vertices, sum(x.length for x in groups))
+
+    def _discretize_edge_group(self, edge_group, parameters: WeldParameters):
+        """Discretize one group of connected edges. Results are cached per group,
+        so that changing one part of a weld only recomputes the groups that are
+        affected, and so that switching back to earlier parameters is free. The
+        cache is shared by all welds, so entries for geometry that no weld uses
+        anymore are evicted by the welds that are still being edited"""
+        bead_size = parameters.bead_size
+        intermittent_parameters = parameters.intermittent_parameters
+        adaptive = parameters.adaptive and intermittent_parameters is None
+        # the fingerprint covers the curve geometry, not just the end points, so
+        # base objects that recompute into different edges never hit a stale entry.
+        # It also follows the order of the sorted chain and the orientation of its
+        # edges, which decide the vertex the chain starts from and its direction.
+        # Stitch positions are measured from that start
+        key = (
+            geometry_fingerprint(edge_group),
+            bead_size,
+            intermittent_parameters,
+            adaptive,
+        )
+
+        def discretize():
+            # the weld length is measured on the edges themselves, rather than on
+            # the discretized points, so it doesn't depend on the point spacing
+            length = welded_length(
+                sum(x.Length for x in edge_group), intermittent_parameters
+            )
+            if intermittent_parameters is not None:
+                return DiscretizedWeld(
                     discretize_intermittent(
-                        edge_group,
-                        bead_size,
-                        float(obj.IntermittentWeldLength.getValueAs("mm")),
-                        float(obj.IntermittentWeldPitch.getValueAs("mm")),
-                        float(obj.IntermittentWeldOffset.getValueAs("mm")),
-                    )
+                        edge_group, bead_size, *intermittent_parameters
+                    ),
+                    length,
                 )
-        else:
-            for edge_group in sorted_edges:
-                lists_of_vertexes.append(
-                    discretize_list_of_edges(edge_group, bead_size)
+            if adaptive:
+                # chords may deviate from the path by a tenth of the bead size,
+                # and segments are kept between 0.5 and 100 bead sizes long
+                points = discretize_edges_adaptive(
+                    edge_group,
+                    deflection=0.1 * bead_size,
+                    angular_deflection=math.radians(10.0),
+                    min_length=0.5 * bead_size,
+                    max_length=100.0 * bead_size,
                 )
-        # the final vertex list is a nested list, where each sublist is a smooth
-        # discretization of multiple connected edges
-        self._vertex_list = lists_of_vertexes
-        self._update_weld_length(obj)
-
-    def _update_weld_length(self, obj):
-        """based on self._vertex_list (a list of lists of FreeCAD.Vector), this
-        function calculates the total path length of weld using the simple
-        cumulative-distance-between-points method.
-        This has some numerical inaccuracy vs. the edge length of the originally
-        selected edges. However, this discrepancy is minimal for reasonable weld
-        bead sizes, and this method works seamlessly with intermittent welds
-        """
-        running_total = 0.0
-        for sublist in self._vertex_list:
-            running_total += sum(
-                starmap(lambda x, y: x.distanceToPoint(y), zip(sublist, sublist[1:]))
-                # zip automatically stops before running off the end of the list-^
-            )
-        self._weld_length = running_total
-        # we must toggle the ReadOnly propertybit in order to set the value at all
-        obj.setPropertyStatus("WeldLength", "-ReadOnly")
-        obj.WeldLength = self._weld_length
-        obj.setPropertyStatus("WeldLength", "ReadOnly")
+            else:
+                points = discretize_edges(edge_group, bead_size)
+            return DiscretizedWeld(PolylineArray.from_polylines([points]), length)
+
+        return _get_group_cache().get(key, discretize)
+
+    @tracing.traced("update_metrics")
+    def _update_metrics(self, obj):
+        """Set the computed metric properties from the exact weld length, which
+        is measured along the selected edges while they are discretized"""
+        bead_size = float(obj.WeldSize.getValueAs("mm"))
+        metrics = weld_metrics(
+            self._weld_length,
+            bead_size,
+            float(obj.FillerDensity.getValueAs("kg/mm^3")),
+            obj.DepositionRate / 3600.0,
+        )
+        _set_read_only_property(obj, "FilletArea", metrics.area)
+        _set_read_only_property(obj, "DepositVolume", metrics.volume)
+        _set_read_only_property(obj, "FillerMass", metrics.mass)
+        _set_read_only_property(obj, "ArcTime", metrics.arc_time)
+        # WeldLength is set last, since the view provider redraws when it changes
+        _set_read_only_property(obj, "WeldLength", metrics.length)
+
+    def get_shape(self, obj) -> Part.Shape:
+        """The solid weld bead, swept along the discretized weld. It's built when
+        first requested, then reused until the path or the bead size changes.
+        Available whether or not ShapeOutput is enabled"""
+        bead_size = float(obj.WeldSize.getValueAs("mm"))
+        key = (self._vertices.fingerprint(), bead_size)
+        cached = getattr(self, "_shape_cache", None)
+        if cached is None or cached[0] != key:
+            with tracing.span("sweep_polylines") as counts:
+                cached = (key, sweep_polylines(self._vertices, bead_size))
+                counts["polylines"] = len(self._vertices)
+            self._shape_cache = cached
+        return cached[1]
+
+    def getSubObject(self, obj, subname, ret_type, matrix, transform, depth):
+        """Called by FreeCAD to resolve the object or its elements. Returns the
+        weld bead as the shape of the object, so that Part.getShape, and through
+        it TechDraw, export and mass properties, can use it. Returns False to
+        leave other lookups to FreeCAD, and None for elements that don't exist"""
+        if not obj.ShapeOutput:
+            return False
+        shape = self.get_shape(obj)
+        if shape.isNull():
+            return False
+        element = subname.rstrip(".")
+        if element:
+            try:
+                shape = shape.getElement(element)
+            except (ValueError, Part.OCCError):
+                return None
+        # the bead is in global coordinates, so only the placement of any
+        # containers needs to be applied
+        if not matrix.isUnity():
+            shape = shape.transformed(matrix)
+        return obj, matrix, shape
+
+    def _set_output_property_status(self, obj):
+        # Computed properties don't touch the object when they are set. Otherwise
+        # results that arrive after a recompute would trigger another recompute
+        for name in [
+            "WeldLength",
+            "FilletArea",
+            "DepositVolume",
+            "FillerMass",
+            "ArcTime",
+        ]:
+            obj.setPropertyStatus(name, "Output")
+
+
+_group_cache = None
+
+
+def _get_group_cache() -> LRUCache:
+    """The cache of discretized edge groups. A single cache is shared by every
+    weld, so that its memory use has one bound however many welds there are"""
+    global _group_cache
+    if _group_cache is None:
+        params = FreeCAD.ParamGet(PARAMETER_PATH)
+        max_megabytes = params.GetInt("DiscretizationCacheSizeMB", 64)
+        _group_cache = LRUCache(max_megabytes * 1024 * 1024)
+    return _group_cache
+
+
+def _set_read_only_property(obj, name, value):
+    # we must toggle the ReadOnly propertybit in order to set the value at all
+    obj.setPropertyStatus(name, "-ReadOnly")
+    setattr(obj, name, value)
+    obj.setPropertyStatus(name, "ReadOnly")
@@ -0,0 +1,63 @@
+from freecad import app as FreeCAD
+import csv
+import os
+import tempfile
+import time
+from freecad.weldfeature import batch
+from freecad.weldfeature.weldfeature import WeldFeature
+import unittest
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "weldment.FCStd")
+        doc = FreeCAD.newDocument("TestBatch")
+        box = doc.addObject("Part::Box", "Box")
+        obj = doc.addObject("App::FeaturePython", "WeldBead")
+        WeldFeature(obj)
+        obj.Base = [(box, ("Edge1", "Edge2"))]
+        doc.saveAs(self.path)
+        FreeCAD.closeDocument(doc.Name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_process_file(self):
+        result = batch.process_file(self.path, report_format="csv")
+        self.assertIsNone(result.error)
+        self.assertEqual(result.weld_count, 1)
+        report_path = os.path.join(self.directory.name, "weldment_welds.csv")
+        with open(report_path, newline="") as stream:
+            rows = list(csv.DictReader(stream))
+        # edges 1 and 2 of the default box are both 10 mm long
+        self.assertAlmostEqual(float(rows[0]["weld_length"]), 20.0)
+
+    def test_missing_file(self):
+        result = batch.process_file(os.path.join(self.directory.name, "nope.FCStd"))
+        self.assertIsNotNone(result.error)
+
+    def test_main(self):
+        output_dir = os.path.join(self.directory.name, "out")
+        os.mkdir(output_dir)
+        exit_code = batch.main(
+            [self.path, "--workers", "1", "--output-dir", output_dir]
+        )
+        self.assertEqual(exit_code, 0)
+        self.assertTrue(os.path.exists(os.path.join(output_dir, "weldment.FCStd")))
+
+    def test_worker_timeout(self):
+        # the workers sleep for as many seconds as their "path". The slow one is
+        # killed, without holding up the others
+        start = time.perf_counter()
+        results = list(batch._run_in_workers(time.sleep, [0.0, 60.0, 0.1], 2, 5.0))
+        self.assertLess(time.perf_counter() - start, 30.0)
+        failed = [x for x in results if x is not None]
+        self.assertEqual(len(results), 3)
+        self.assertEqual(len(failed), 1)
+        self.assertEqual(failed[0].path, 60.0)
+        self.assertIn("timed out", failed[0].error)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,224 @@
+from freecad import app as FreeCAD
+import Part
+from freecad.weldfeature import geom_utils
+from freecad.weldfeature import geometry_cache
+from freecad.weldfeature import tangent_edges
+import json
+import math
+import os
+import timeit
+import unittest
+import numpy
+
+# The benchmarks are slow, and their timings only mean something on the machine
+# that recorded the baseline, so they only run when asked for:
+#   WELDFEATURE_BENCHMARK=1 python -m unittest tests.test_benchmarks
+# The baseline is written on the first run. Set WELDFEATURE_BENCHMARK_UPDATE=1 to
+# record a new one, and WELDFEATURE_BENCHMARK_TOLERANCE to change the slowdown
+# that counts as a regression
+ENABLED = os.environ.get("WELDFEATURE_BENCHMARK", "0") != "0"
+UPDATE_BASELINE = os.environ.get("WELDFEATURE_BENCHMARK_UPDATE", "0") != "0"
+TOLERANCE = float(os.environ.get("WELDFEATURE_BENCHMARK_TOLERANCE", "1.5"))
+BASELINE_PATH = os.environ.get(
+    "WELDFEATURE_BENCHMARK_BASELINE",
+    os.path.join(os.path.dirname(__file__), "benchmark_baseline.json"),
+)
+# timings this short are dominated by noise
+MINIMUM_SECONDS = 1e-3
+SIZES = [10, 100, 1000]
+SPACING = 1.0
+
+
+def straight_chain(n):
+    points = [FreeCAD.Vector(10.0 * i, 0, 0) for i in range(n + 1)]
+    return [Part.makeLine(a, b) for a, b in zip(points[:-1], points[1:])]
+
+
+def arc_chain(n):
+    """half circles, alternately above and below the X axis"""
+    edges = []
+    for i in range(n):
+        center = FreeCAD.Vector(10.0 * i + 5.0, 0, 0)
+        first, last = (0.0, 180.0) if i % 2 else (180.0, 360.0)
+        edges.append(Part.makeCircle(5.0, center, FreeCAD.Vector(0, 0, 1), first, last))
+    return edges
+
+
+def bspline_chain(n):
+    edges = []
+    for i in range(n):
+        points = [
+            FreeCAD.Vector(x, 3.0 * math.sin(math.pi * x / 5.0), x / 10.0)
+            for x in numpy.linspace(10.0 * i, 10.0 * (i + 1), 6)
+        ]
+        curve = Part.BSplineCurve()
+        curve.interpolate(points)
+        edges.append(curve.toShape())
+    return edges
+
+
+def pipe_seam(n):
+    """a full circle, split into n arcs"""
+    angles = numpy.linspace(0.0, 360.0, n + 1)
+    return [
+        Part.makeCircle(
+            50.0, FreeCAD.Vector(0, 0, 0), FreeCAD.Vector(0, 0, 1), first, last
+        )
+        for first, last in zip(angles[:-1], angles[1:])
+    ]
+
+
+def box_frame(n):
+    """separate boxes with n edges in total, like the members of a frame"""
+    boxes = [
+        Part.makeBox(5.0, 5.0, 100.0, FreeCAD.Vector(20.0 * i, 0, 0))
+        for i in range(max(1, n // 12))
+    ]
+    return Part.makeCompound(boxes).Edges
+
+
+EDGE_SETS = {
+    "straight": straight_chain,
+    "arcs": arc_chain,
+    "bspline": bspline_chain,
+    "pipe_seam": pipe_seam,
+}
+
+
+def best_time(function, repeat=5):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+@unittest.skipUnless(ENABLED, "set WELDFEATURE_BENCHMARK=1 to run benchmarks")
+class TestBenchmarks(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.baseline = {}
+        if os.path.exists(BASELINE_PATH) and not UPDATE_BASELINE:
+            with open(BASELINE_PATH) as f:
+                cls.baseline = json.load(f)
+        cls.results = {}
+        cls.doc = FreeCAD.newDocument("WeldFeatureBenchmarks")
+
+    @classmethod
+    def tearDownClass(cls):
+        FreeCAD.closeDocument(cls.doc.Name)
+        new_entries = {k: v for k, v in cls.results.items() if k not in cls.baseline}
+        if new_entries:
+            with open(BASELINE_PATH, "w") as f:
+                json.dump({**cls.baseline, **new_entries}, f, indent=2, sort_keys=True)
+
+    def check_timing(self, name, function):
+        seconds = best_time(function)
+        self.results[name] = seconds
+        print(f"{name}: {1000.0 * seconds:.3f} ms")
+        expected = self.baseline.get(name)
+        if expected is None:
+            return  # recorded as the new baseline
+        limit = TOLERANCE * max(expected, MINIMUM_SECONDS)
+        with self.subTest(name):
+            self.assertLessEqual(
+                seconds,
+                limit,
+                f"{name} regressed: {seconds:.4f} s vs. a baseline of {expected:.4f} s",
+            )
+
+    def test_composite_edge(self):
+        for set_name, make_edges in EDGE_SETS.items():
+            for size in SIZES:
+                edges = make_edges(size)
+                self.check_timing(
+                    f"CompositeEdge/{set_name}/{size}",
+                    lambda: geom_utils.CompositeEdge(edges),
+                )
+                comp = geom_utils.CompositeEdge(edges)
+                params = numpy.linspace(0.0, comp.Length, 1000).tolist()
+                self.check_timing(
+                    f"CompositeEdge.valueAt/{set_name}/{size}",
+                    lambda: [comp.valueAt(x) for x in params],
+                )
+
+    def test_discretize_list_of_edges(self):
+        for set_name, make_edges in EDGE_SETS.items():
+            for size in SIZES:
+                edges = make_edges(size)
+                self.check_timing(
+                    f"discretize_list_of_edges/{set_name}/{size}",
+                    lambda: geom_utils.discretize_list_of_edges(edges, SPACING),
+                )
+
+    def test_discretize_intermittent(self):
+        for set_name, make_edges in EDGE_SETS.items():
+            for size in SIZES:
+                edges = make_edges(size)
+                self.check_timing(
+                    f"discretize_intermittent/{set_name}/{size}",
+                    lambda: geom_utils.discretize_intermittent(
+                        edges, SPACING, 15.0, 50.0, 0.0
+                    ),
+                )
+
+    def test_propagate(self):
+        for set_name, make_edges in {**EDGE_SETS, "box_frame": box_frame}.items():
+            for size in SIZES:
+                shape = Part.makeCompound(make_edges(size))
+                self.check_timing(
+                    f"propagate/{set_name}/{size}",
+                    lambda: tangent_edges.propagate(shape),
+                )
+
+    def test_expand_selection_to_geometry(self):
+        for set_name, make_edges in {**EDGE_SETS, "box_frame": box_frame}.items():
+            for size in SIZES:
+                feature = self.doc.addObject("Part::Feature", f"{set_name}{size}")
+                feature.Shape = Part.makeCompound(make_edges(size))
+                # a single selected edge, expanded to everything tangent to it.
+                # The cached edge index is dropped, to time the first expansion
+                selection = [(feature, ["Edge1"])]
+                cache = geometry_cache.get_document_cache(self.doc)
+
+                def expand():
+                    cache.clear()
+                    tangent_edges.expand_selection_to_geometry(selection, True)
+
+                self.check_timing(
+                    f"expand_selection_to_geometry/{set_name}/{size}", expand
+                )
+
+    def test_matches_reference_discretization(self):
+        # the optimized discretization may distribute points differently, but
+        # must trace the same path as the reference implementation
+        for set_name, make_edges in EDGE_SETS.items():
+            for size in SIZES[:2]:
+                edges = make_edges(size)
+                path = Part.makeCompound(edges)
+                optimized = geom_utils.discretize_list_of_edges(edges, SPACING)
+                reference = geom_utils._discretize_list_of_edges(edges, SPACING)
+                with self.subTest(f"{set_name}/{size}"):
+                    self.assertEqual(
+                        {
+                            tuple(numpy.round(x, 6))
+                            for x in (optimized[0], optimized[-1])
+                        },
+                        {
+                            tuple(numpy.round(x, 6))
+                            for x in (reference[0], reference[-1])
+                        },
+                    )
+                    for point in optimized:
+                        self.assertLess(path.distToShape(Part.Vertex(point))[0], 1e-6)
+                    optimized_length = sum(
+                        a.distanceToPoint(b) for a, b in zip(optimized, optimized[1:])
+                    )
+                    reference_length = sum(
+                        a.distanceToPoint(b) for a, b in zip(reference, reference[1:])
+                    )
+                    self.assertAlmostEqual(
+                        optimized_length,
+                        reference_length,
+                        delta=0.01 * reference_length,
+                    )
+
+
+if __name__ == "__main__":
+    unittest.main()
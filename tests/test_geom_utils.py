@@ -1,7 +1,9 @@
 from freecad import app as FreeCAD
 import Part
 from freecad.weldfeature import geom_utils
+import math
 import unittest
+import numpy
 
 
 class TestRoundVector(unittest.TestCase):
@@ -59,6 +61,281 @@ class TestCompositeEdge(unittest.TestCase):
             (v1 + 0.5 * (v2 - v1)).isEqual(comp.valueAt(comp.Length / 2), 1e-5)
         )
 
+    def test_value_at_multiple_edges(self):
+        v1 = FreeCAD.Vector(0.0, 0.0, 0.0)
+        v2 = FreeCAD.Vector(1.0, 0.0, 0.0)
+        v3 = FreeCAD.Vector(1.0, 2.0, 0.0)
+        v4 = FreeCAD.Vector(4.0, 2.0, 0.0)
+        # the middle edge is reversed relative to its neighbours
+        edges = [Part.makeLine(v1, v2), Part.makeLine(v3, v2), Part.makeLine(v3, v4)]
+        comp = geom_utils.CompositeEdge(edges)
+        self.assertAlmostEqual(6.0, comp.Length, places=5)
+        self.assertEqual((0.0, comp.Length), comp.ParameterRange)
+        # the composite may run in either direction, depending on Part.sortEdges
+        if comp.valueAt(0.0).isEqual(v1, 1e-5):
+            params = (1.0, 2.0, 3.0)
+        else:
+            params = (5.0, 4.0, 3.0)
+        expected = (v2, FreeCAD.Vector(1.0, 1.0, 0.0), v3)
+        for param, point in zip(params, expected):
+            self.assertTrue(point.isEqual(comp.valueAt(param), 1e-5))
+
+    def test_value_at_many_matches_value_at(self):
+        edges = [
+            Part.makeLine(FreeCAD.Vector(0, 0, 0), FreeCAD.Vector(2, 0, 0)),
+            Part.makeCircle(
+                1.0, FreeCAD.Vector(2, 1, 0), FreeCAD.Vector(0, 0, 1), 270.0, 360.0
+            ),
+            Part.makeLine(FreeCAD.Vector(3, 1, 0), FreeCAD.Vector(3, 4, 0)),
+        ]
+        comp = geom_utils.CompositeEdge(edges)
+        # deliberately unordered, with a repeated value
+        params = [comp.Length, 0.0, 2.5, 0.1, comp.Length / 2, 2.5]
+        points = comp.valueAtMany(params)
+        self.assertEqual(len(params), len(points))
+        for param, point in zip(params, points):
+            self.assertTrue(comp.valueAt(param).isEqual(point, 1e-7))
+
+    def test_value_at_follows_arc_length(self):
+        # a straight bezier curve, whose parameter is far from proportional to
+        # its arc length
+        curve = Part.BSplineCurve()
+        curve.buildFromPoles(
+            [FreeCAD.Vector(x, 0, 0) for x in [0.0, 1.0, 2.0, 10.0]], False, 3
+        )
+        edge = curve.toShape()
+        comp = geom_utils.CompositeEdge([edge])
+        params = numpy.linspace(0.0, comp.Length, 11).tolist()
+        points = comp.valueAtMany(params)
+        for param, point in zip(params, points):
+            self.assertAlmostEqual(point.x, param, delta=1e-2)
+            self.assertTrue(comp.valueAt(param).isEqual(point, 1e-7))
+
+    def test_value_at_out_of_range(self):
+        e1 = Part.makeLine(FreeCAD.Vector(0, 0, 0), FreeCAD.Vector(1, 0, 0))
+        comp = geom_utils.CompositeEdge([e1])
+        with self.assertRaises(ValueError):
+            comp.valueAt(1.5)
+        with self.assertRaises(ValueError):
+            comp.valueAtMany([0.5, -0.1])
+
+
+class TestDiscretizeEdges(unittest.TestCase):
+    def test_split_point_budget(self):
+        self.assertEqual(geom_utils.split_point_budget([1.0, 1.0, 2.0], 8), [2, 2, 4])
+        self.assertEqual(sum(geom_utils.split_point_budget([1.0, 2.0, 4.0], 10)), 10)
+        # short edges always get at least one segment, degenerate edges get none
+        self.assertEqual(geom_utils.split_point_budget([0.01, 10.0, 0.0], 5), [1, 4, 0])
+
+    def test_discretize_connected_edges(self):
+        v1 = FreeCAD.Vector(0.0, 0.0, 0.0)
+        v2 = FreeCAD.Vector(10.0, 0.0, 0.0)
+        v3 = FreeCAD.Vector(10.0, 5.0, 0.0)
+        edges = [Part.makeLine(v2, v1), Part.makeLine(v2, v3)]
+        points = geom_utils.discretize_edges(edges, 1.0)
+        self.assertEqual(points.shape, (16, 3))
+        # consecutive points are evenly spaced and never duplicated at the joint
+        spacings = numpy.linalg.norm(numpy.diff(points, axis=0), axis=1)
+        self.assertTrue(numpy.allclose(spacings, 1.0))
+        ends = [FreeCAD.Vector(*points[0]), FreeCAD.Vector(*points[-1])]
+        self.assertTrue(any(v1.isEqual(x, 1e-7) for x in ends))
+        self.assertTrue(any(v3.isEqual(x, 1e-7) for x in ends))
+
+    def test_enforce_segment_lengths(self):
+        points = numpy.array(
+            [[0, 0, 0], [0.1, 0, 0], [10, 0, 0], [10, 0.2, 0], [10, 5, 0]], dtype=float
+        )
+        cleaned = geom_utils.enforce_segment_lengths(points, 0.5, 3.0)
+        lengths = numpy.linalg.norm(numpy.diff(cleaned, axis=0), axis=1)
+        self.assertTrue(numpy.all(lengths >= 0.5))
+        self.assertTrue(numpy.all(lengths <= 3.0))
+        self.assertTrue(numpy.array_equal(cleaned[0], points[0]))
+        self.assertTrue(numpy.array_equal(cleaned[-1], points[-1]))
+        # the corner is kept
+        self.assertTrue(any(numpy.array_equal(x, [10, 0, 0]) for x in cleaned))
+
+    def test_adaptive_discretization(self):
+        line = Part.makeLine(FreeCAD.Vector(-1000, 0, 0), FreeCAD.Vector(0, 0, 0))
+        arc = Part.makeCircle(
+            10.0, FreeCAD.Vector(0, 10, 0), FreeCAD.Vector(0, 0, 1), 270.0, 360.0
+        )
+        points = geom_utils.discretize_edges_adaptive(
+            [line, arc], 0.1, math.radians(10.0), 1.0, 100.0
+        )
+        # the long straight run only gets as many points as max_length requires,
+        # while the arc is finely divided
+        on_line = [x for x in points if abs(x[1]) < 1e-9 and x[0] < 0.0]
+        self.assertLessEqual(len(on_line), 11)
+        self.assertGreater(len(points) - len(on_line), 5)
+        # all points lie on the path
+        for x in points:
+            if x[0] > 0.0:
+                self.assertAlmostEqual(
+                    numpy.linalg.norm(x - numpy.array([0, 10, 0])), 10.0, places=5
+                )
+
+    def test_discretize_list_of_edges_returns_vectors(self):
+        e1 = Part.makeLine(FreeCAD.Vector(0, 0, 0), FreeCAD.Vector(1, 0, 0))
+        points = geom_utils.discretize_list_of_edges([e1], 0.25)
+        self.assertEqual(len(points), 5)
+        self.assertTrue(all(isinstance(x, FreeCAD.Vector) for x in points))
+
+    def test_discretize_intermittent(self):
+        edges = [
+            Part.makeLine(FreeCAD.Vector(0, 0, 0), FreeCAD.Vector(60, 0, 0)),
+            Part.makeLine(FreeCAD.Vector(100, 0, 0), FreeCAD.Vector(60, 0, 0)),
+        ]
+        stitches = geom_utils.discretize_intermittent(edges, 1.0, 15.0, 50.0, 5.0)
+        self.assertEqual(len(stitches), 2)
+        self.assertEqual(len(stitches[0]), 16)
+        numpy.testing.assert_allclose(stitches[0][[0, -1], 0], [5.0, 20.0])
+        # the second stitch crosses the reversed edge
+        numpy.testing.assert_allclose(stitches[1][[0, -1], 0], [55.0, 70.0])
+        centered = geom_utils.discretize_intermittent(
+            edges, 1.0, 15.0, 50.0, 5.0, "Centered"
+        )
+        numpy.testing.assert_allclose(centered.points[[0, -1], 0], [17.5, 82.5])
+        both_ends = geom_utils.discretize_intermittent(
+            edges, 1.0, 15.0, 50.0, 5.0, "Both Ends"
+        )
+        self.assertEqual(len(both_ends), 3)
+        numpy.testing.assert_allclose(both_ends.points[[0, -1], 0], [0.0, 100.0])
+
+
+class TestPolylineArray(unittest.TestCase):
+    def setUp(self):
+        self.polylines = geom_utils.PolylineArray.from_polylines(
+            [
+                [FreeCAD.Vector(0, 0, 0), FreeCAD.Vector(1, 0, 0)],
+                numpy.array([[5.0, 5.0, 5.0], [5.0, 5.0, 7.0], [5.0, 8.0, 7.0]]),
+            ]
+        )
+
+    def test_storage(self):
+        self.assertEqual(len(self.polylines), 2)
+        self.assertEqual(self.polylines.points.shape, (5, 3))
+        self.assertEqual(self.polylines.offsets.tolist(), [0, 2, 5])
+        self.assertTrue(numpy.array_equal(self.polylines[1][0], [5.0, 5.0, 5.0]))
+
+    def test_length_skips_gaps_between_polylines(self):
+        self.assertEqual(self.polylines.segment_lengths().tolist(), [1.0, 2.0, 3.0])
+        self.assertAlmostEqual(self.polylines.length(), 6.0)
+
+    def test_to_vectors(self):
+        vectors = self.polylines.to_vectors()
+        self.assertEqual([len(x) for x in vectors], [2, 3])
+        self.assertEqual(vectors[1][2], FreeCAD.Vector(5.0, 8.0, 7.0))
+
+    def test_concatenate(self):
+        combined = geom_utils.PolylineArray.concatenate(
+            [self.polylines, geom_utils.PolylineArray(), self.polylines]
+        )
+        self.assertEqual(len(combined), 4)
+        self.assertEqual(combined.offsets.tolist(), [0, 2, 5, 7, 10])
+        self.assertAlmostEqual(combined.length(), 12.0)
+
+    def test_decimate(self):
+        line = numpy.zeros((101, 3))
+        line[:, 0] = numpy.linspace(0.0, 10.0, 101)
+        polylines = geom_utils.PolylineArray.from_polylines([line, line[:2]])
+        decimated = polylines.decimate(2.0)
+        self.assertEqual(len(decimated), 2)
+        self.assertTrue(numpy.allclose(decimated[0][:, 0], [0, 2, 4, 6, 8, 10]))
+        self.assertTrue(numpy.allclose(decimated[1], line[:2]))
+        self.assertAlmostEqual(decimated.length(), polylines.length())
+
+    def test_empty(self):
+        empty = geom_utils.PolylineArray()
+        self.assertEqual(len(empty), 0)
+        self.assertEqual(empty.length(), 0.0)
+        self.assertEqual(empty.to_vectors(), [])
+
+
+class TestCoinTransformMatrices(unittest.TestCase):
+    def test_rotations_from_y_axis(self):
+        directions = numpy.array(
+            [[1.0, 0.0, 0.0], [0.0, -3.0, 0.0], [1.0, 2.0, 3.0], [0.0, 0.0, 0.0]]
+        )
+        rotations = geom_utils.rotations_from_y_axis(directions)
+        expected = [[1, 0, 0], [0, -1, 0], numpy.array([1, 2, 3]) / 14**0.5, [0, 1, 0]]
+        for rotation, direction in zip(rotations, expected):
+            self.assertTrue(numpy.allclose(rotation @ [0.0, 1.0, 0.0], direction))
+            self.assertTrue(numpy.allclose(rotation @ rotation.T, numpy.eye(3)))
+
+    def test_matrices_match_sbmatrix_layout(self):
+        # Coin multiplies row vectors from the left, so the translation is
+        # stored in the last row
+        matrices = geom_utils.coin_transform_matrices(
+            [[1.0, 2.0, 3.0]], [[0.0, 0.0, 1.0]], [[1.0, 5.0, 1.0]]
+        )
+        tip = numpy.array([0.0, 1.0, 0.0, 1.0]) @ matrices[0]
+        self.assertTrue(numpy.allclose(tip, [1.0, 2.0, 8.0, 1.0]))
+        self.assertTrue(numpy.allclose(matrices[0][3], [1.0, 2.0, 3.0, 1.0]))
+
+
+class TestTubeMesh(unittest.TestCase):
+    def test_straight_tube(self):
+        polylines = geom_utils.PolylineArray.from_polylines(
+            [numpy.array([[0.0, 0.0, 0.0], [0.0, 0.0, 5.0], [0.0, 0.0, 10.0]])]
+        )
+        coordinates, normals, faces, parity = geom_utils.tube_mesh(
+            polylines, 2.0, sides=8
+        )
+        self.assertEqual(coordinates.shape, (24, 3))
+        self.assertEqual(faces.shape, (16, 4))
+        self.assertEqual(sorted(set(parity.tolist())), [0, 1])
+        radii = numpy.linalg.norm(coordinates[:, :2], axis=1)
+        self.assertTrue(numpy.allclose(radii, 2.0))
+        self.assertTrue(numpy.allclose(normals[:, 2], 0.0))
+
+    def test_corner_ring_lies_on_mitre_plane(self):
+        polylines = geom_utils.PolylineArray.from_polylines(
+            [numpy.array([[0.0, 0.0, 0.0], [10.0, 0.0, 0.0], [10.0, 10.0, 0.0]])]
+        )
+        coordinates, _, faces, _ = geom_utils.tube_mesh(polylines, 1.0, sides=8)
+        corner_ring = coordinates[8:16] - [10.0, 0.0, 0.0]
+        mitre = numpy.array([1.0, 1.0, 0.0]) / 2**0.5
+        self.assertTrue(numpy.allclose(corner_ring @ mitre, 0.0))
+        self.assertEqual(faces.max(), len(coordinates) - 1)
+
+    def test_path_doubling_back(self):
+        polylines = geom_utils.PolylineArray.from_polylines(
+            [numpy.array([[0.0, 0.0, 0.0], [10.0, 0.0, 0.0], [5.0, 0.0, 0.0]])]
+        )
+        coordinates, normals, _, _ = geom_utils.tube_mesh(polylines, 1.0, sides=8)
+        self.assertTrue(numpy.isfinite(coordinates).all())
+        self.assertTrue(numpy.isfinite(normals).all())
+        # the ring at the reversal is perpendicular to the path
+        turn_ring = coordinates[8:16] - [10.0, 0.0, 0.0]
+        self.assertTrue(numpy.allclose(turn_ring[:, 0], 0.0))
+
+    def test_empty(self):
+        coordinates, normals, faces, parity = geom_utils.tube_mesh(
+            geom_utils.PolylineArray(), 1.0
+        )
+        self.assertEqual(len(coordinates), 0)
+        self.assertEqual(len(faces), 0)
+
+
+class TestSweepPolylines(unittest.TestCase):
+    def test_straight_sweep(self):
+        polylines = geom_utils.PolylineArray.from_polylines(
+            [[[0.0, 0.0, 0.0], [0.0, 0.0, 5.0], [0.0, 0.0, 10.0]], [[1.0, 1.0, 1.0]]]
+        )
+        shape = geom_utils.sweep_polylines(polylines, 1.0)
+        # the single point polyline can't be swept
+        self.assertEqual(len(shape.Solids), 1)
+        self.assertAlmostEqual(shape.Volume, math.pi * 10.0, places=3)
+
+    def test_fingerprint_tracks_contents(self):
+        polylines = geom_utils.PolylineArray.from_polylines(
+            [[[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]]]
+        )
+        same = geom_utils.PolylineArray(polylines.points.copy(), polylines.offsets)
+        split = geom_utils.PolylineArray(polylines.points, [0, 1, 2])
+        self.assertEqual(polylines.fingerprint(), same.fingerprint())
+        self.assertNotEqual(polylines.fingerprint(), split.fingerprint())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,151 @@
+from freecad import app as FreeCAD
+import Part
+from freecad.weldfeature import geometry_cache
+import threading
+import time
+import unittest
+
+
+class FakeIndex:
+    def __init__(self, shape, nbytes=100):
+        self.shape = shape
+        self.nbytes = nbytes
+
+
+class TestGeometryFingerprint(unittest.TestCase):
+    def test_identical_geometry_matches(self):
+        box1 = Part.makeBox(1.0, 2.0, 3.0)
+        box2 = Part.makeBox(1.0, 2.0, 3.0)
+        self.assertEqual(
+            geometry_cache.geometry_fingerprint(box1.Edges),
+            geometry_cache.geometry_fingerprint(box2.Edges),
+        )
+
+    def test_different_geometry_differs(self):
+        box1 = Part.makeBox(1.0, 2.0, 3.0)
+        box2 = Part.makeBox(1.0, 2.0, 3.0, FreeCAD.Vector(0.0, 0.0, 1.0))
+        line = Part.makeLine(FreeCAD.Vector(1, 0, 0), FreeCAD.Vector(-1, 0, 0))
+        arc = Part.makeCircle(1.0, FreeCAD.Vector(), FreeCAD.Vector(0, 0, 1), 0, 180)
+        self.assertNotEqual(
+            geometry_cache.geometry_fingerprint(box1.Edges),
+            geometry_cache.geometry_fingerprint(box2.Edges),
+        )
+        self.assertNotEqual(
+            geometry_cache.geometry_fingerprint([line]),
+            geometry_cache.geometry_fingerprint([arc]),
+        )
+
+    def test_curves_with_shared_ends_differ(self):
+        # arcs of different radii between the same end points
+        a = FreeCAD.Vector(-1, 0, 0)
+        b = FreeCAD.Vector(1, 0, 0)
+        small_arc = Part.Arc(a, FreeCAD.Vector(0, 1, 0), b).toShape()
+        large_arc = Part.Arc(a, FreeCAD.Vector(0, 0.5, 0), b).toShape()
+        self.assertNotEqual(
+            geometry_cache.geometry_fingerprint([small_arc]),
+            geometry_cache.geometry_fingerprint([large_arc]),
+        )
+
+    def test_edge_set_fingerprint_ignores_order(self):
+        edges = Part.makeBox(1.0, 2.0, 3.0).Edges
+        self.assertEqual(
+            geometry_cache.edge_set_fingerprint(edges),
+            geometry_cache.edge_set_fingerprint(list(reversed(edges))),
+        )
+        self.assertNotEqual(
+            geometry_cache.edge_set_fingerprint(edges),
+            geometry_cache.edge_set_fingerprint(edges[1:]),
+        )
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get(self):
+        cache = geometry_cache.LRUCache(max_bytes=1000)
+        first = cache.get(("a", 1.0), lambda: FakeIndex(None))
+        self.assertIs(first, cache.get(("a", 1.0), lambda: FakeIndex(None)))
+        self.assertIsNot(first, cache.get(("a", 2.0), lambda: FakeIndex(None)))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_keeps_oversized_newest_entry(self):
+        cache = geometry_cache.LRUCache(max_bytes=50)
+        cache.get("a", lambda: FakeIndex(None))
+        cache.get("b", lambda: FakeIndex(None))
+        self.assertEqual(cache.stats()["entries"], 1)
+        self.assertEqual(cache.stats()["bytes"], 100)
+
+
+class TestGeometryCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = geometry_cache.GeometryCache(max_bytes=1000)
+        first = cache.lookup("Box", Part.makeBox(1, 1, 1), FakeIndex)
+        # another object with identical geometry shares the entry
+        second = cache.lookup("Box001", Part.makeBox(1, 1, 1), FakeIndex)
+        self.assertIs(first, second)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_invalidate(self):
+        cache = geometry_cache.GeometryCache(max_bytes=1000)
+        first = cache.lookup("Box", Part.makeBox(1, 1, 1), FakeIndex)
+        cache.invalidate("Box")
+        self.assertEqual(cache.stats()["entries"], 0)
+        second = cache.lookup("Box", Part.makeBox(1, 1, 1), FakeIndex)
+        self.assertIsNot(first, second)
+        self.assertEqual(cache.misses, 2)
+
+    def test_evicts_least_recently_used(self):
+        cache = geometry_cache.GeometryCache(max_bytes=250)
+        cache.lookup("A", Part.makeBox(1, 1, 1), FakeIndex)
+        cache.lookup("B", Part.makeBox(2, 2, 2), FakeIndex)
+        cache.lookup("A", Part.makeBox(1, 1, 1), FakeIndex)
+        cache.lookup("C", Part.makeBox(3, 3, 3), FakeIndex)
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertEqual(cache.stats()["bytes"], 200)
+        # "B" was the least recently used, so it was evicted
+        cache.lookup("B", Part.makeBox(2, 2, 2), FakeIndex)
+        self.assertEqual(cache.misses, 4)
+
+    def test_tangent_index_follows_curve_changes(self):
+        cache = geometry_cache.GeometryCache(max_bytes=1000)
+        a = FreeCAD.Vector(-1, 0, 0)
+        b = FreeCAD.Vector(1, 0, 0)
+        first = cache.lookup(
+            "Arc", Part.Arc(a, FreeCAD.Vector(0, 1, 0), b).toShape(), FakeIndex
+        )
+        second = cache.lookup(
+            "Arc001", Part.Arc(a, FreeCAD.Vector(0, 0.5, 0), b).toShape(), FakeIndex
+        )
+        self.assertIsNot(first, second)
+
+    def test_invalidate_doesnt_wait_for_lookup(self):
+        # a background thread building an index mustn't block the GUI thread,
+        # which invalidates cached geometry as soon as objects recompute
+        cache = geometry_cache.GeometryCache(max_bytes=1000)
+        started = threading.Event()
+        finish = threading.Event()
+
+        def slow_factory(shape):
+            started.set()
+            finish.wait(10.0)
+            return FakeIndex(shape)
+
+        thread = threading.Thread(
+            target=cache.lookup, args=("Box", Part.makeBox(1, 1, 1), slow_factory)
+        )
+        thread.start()
+        self.assertTrue(started.wait(10.0))
+        start = time.perf_counter()
+        cache.invalidate("Box")
+        elapsed = time.perf_counter() - start
+        finish.set()
+        thread.join()
+        self.assertLess(elapsed, 1.0)
+        # the lookup was invalidated while it ran, so its owner isn't recorded.
+        # Its entry is kept, as it is keyed by the geometry it was built from
+        cache.invalidate("Box")
+        self.assertEqual(cache.misses, 1)
+        cache.lookup("Box", Part.makeBox(1, 1, 1), FakeIndex)
+        self.assertEqual(cache.hits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+from freecad.weldfeature import shared_nodes
+import unittest
+
+
+class TestSharedNodeRegistry(unittest.TestCase):
+    def test_nodes_are_shared_until_released(self):
+        registry = shared_nodes.SharedNodeRegistry()
+        key = shared_nodes.sphere_key(2.0)
+        first = registry.acquire(key, lambda: shared_nodes.make_sphere(2.0))
+        second = registry.acquire(key, lambda: shared_nodes.make_sphere(2.0))
+        self.assertIs(first, second)
+        self.assertEqual(registry.reference_count(key), 2)
+        registry.release(key)
+        self.assertEqual(len(registry), 1)
+        registry.release(key)
+        self.assertEqual(len(registry), 0)
+        # releasing a key that is no longer held does nothing
+        registry.release(key)
+        self.assertEqual(registry.reference_count(key), 0)
+
+    def test_keys(self):
+        self.assertEqual(
+            shared_nodes.material_key((0.1, 0.2, 0.3)),
+            shared_nodes.material_key((0.10000001, 0.2, 0.3, 1.0)),
+        )
+        self.assertNotEqual(
+            shared_nodes.endcap_key("Flat", 1.0),
+            shared_nodes.endcap_key("Rounded", 1.0),
+        )
+
+    def test_make_material(self):
+        material = shared_nodes.make_material((1.0, 0.0, 0.0), (0.0, 0.0, 1.0))
+        self.assertEqual(material.diffuseColor.getNum(), 2)
+
+    def test_unknown_endcap_style(self):
+        with self.assertRaises(ValueError):
+            shared_nodes.make_endcap("Square", 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
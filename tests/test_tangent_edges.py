@@ -0,0 +1,90 @@
+from freecad import app as FreeCAD
+import Part
+from freecad.weldfeature import tangent_edges
+import math
+import unittest
+import numpy
+
+
+def make_test_shape():
+    """A straight line running smoothly into an arc and another line,
+    followed by a sharp 90 degree corner"""
+    e1 = Part.makeLine(FreeCAD.Vector(0, 0, 0), FreeCAD.Vector(10, 0, 0))
+    e2 = Part.makeCircle(
+        5.0, FreeCAD.Vector(10, 5, 0), FreeCAD.Vector(0, 0, 1), 270.0, 360.0
+    )
+    e3 = Part.makeLine(FreeCAD.Vector(15, 10, 0), FreeCAD.Vector(15, 5, 0))
+    e4 = Part.makeLine(FreeCAD.Vector(15, 10, 0), FreeCAD.Vector(0, 10, 0))
+    return Part.Compound([e1, e2, e3, e4])
+
+
+class TestEndpointIndex(unittest.TestCase):
+    def test_endpoint_data(self):
+        edge = Part.makeLine(FreeCAD.Vector(1, 2, 3), FreeCAD.Vector(1, 2, 5))
+        points, tangents = tangent_edges.edge_endpoint_data([edge])
+        self.assertTrue(numpy.allclose(points[0], [[1, 2, 3], [1, 2, 5]]))
+        # tangents point away from the edge at both ends
+        self.assertLess(tangents[0, 0, 2], 0.0)
+        self.assertGreater(tangents[0, 1, 2], 0.0)
+
+    def test_coincident_endpoints(self):
+        points = numpy.array(
+            [
+                [[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]],
+                [[1.0, 0.000001, 0.0], [2.0, 0.0, 0.0]],
+                [[5.0, 5.0, 5.0], [2.00002, 0.0, 0.0]],
+            ]
+        )
+        pairs = list(tangent_edges.coincident_endpoints(points, eps=1e-5))
+        self.assertEqual(pairs, [(1, 2)])
+
+    def test_angle_between_vectors(self):
+        self.assertAlmostEqual(
+            tangent_edges.angle_between_vectors([1, 0, 0], [-2, 0, 0]), math.pi
+        )
+        self.assertEqual(tangent_edges.angle_between_vectors([0, 0, 0], [1, 0, 0]), 0)
+
+
+class TestComponents(unittest.TestCase):
+    def test_connected_component_labels(self):
+        labels = tangent_edges.connected_component_labels(6, [(0, 1), (4, 1), (2, 5)])
+        self.assertEqual(labels[0], labels[1])
+        self.assertEqual(labels[0], labels[4])
+        self.assertEqual(labels[2], labels[5])
+        self.assertEqual(len(set(labels)), 3)
+
+    def test_connected_edges(self):
+        components = tangent_edges.TangentEdgeComponents([0, 0, 2, 0, 2])
+        self.assertEqual(components.connected_edges(3), [0, 1, 3])
+        self.assertEqual(components.connected_edges(2), [2, 4])
+
+
+class TestPropagate(unittest.TestCase):
+    def test_propagates_along_tangent_edges(self):
+        components = tangent_edges.propagate(make_test_shape())
+        self.assertEqual(components.connected_edges(0), [0, 1, 2])
+        self.assertEqual(components.connected_edges(3), [3])
+
+
+class TestExpandSelection(unittest.TestCase):
+    def test_unique_edges(self):
+        box = Part.makeBox(1, 1, 1)
+        # the two faces share one edge, and the first edge is repeated
+        edges = box.Faces[0].Edges + box.Faces[2].Edges + [box.Faces[0].Edges[0]]
+        self.assertEqual(len(tangent_edges.unique_edges(edges)), 7)
+
+    def test_adjacent_faces_share_edges(self):
+        doc = FreeCAD.newDocument()
+        try:
+            box = doc.addObject("Part::Box", "Box")
+            doc.recompute()
+            edges = tangent_edges.expand_selection_to_geometry(
+                [(box, ["Face1", "Face3", "Edge1"])]
+            )
+            self.assertEqual(len(edges), 7)
+        finally:
+            FreeCAD.closeDocument(doc.Name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+from freecad import app as FreeCAD  # noqa: F401
+from freecad.weldfeature import tracing
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+
+def read_trace_file(path):
+    # the closing bracket of the trace-event array is left out while tracing
+    with open(path) as f:
+        text = f.read().rstrip().rstrip(",")
+    return json.loads(text + "]")
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "trace.json")
+        tracing.close_trace_file()
+
+    def tearDown(self):
+        tracing.close_trace_file()
+        self.directory.cleanup()
+
+    def test_disabled(self):
+        with mock.patch.dict(os.environ, {"WELDFEATURE_TRACE_FILE": self.path}):
+            os.environ.pop("WELDFEATURE_TRACE", None)
+            if tracing.is_enabled():
+                self.skipTest("tracing is enabled by a preference")
+            with tracing.span("execute", weld="WeldBead") as counts:
+                counts["edges"] = 3
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_nested_spans(self):
+        environment = {"WELDFEATURE_TRACE": "1", "WELDFEATURE_TRACE_FILE": self.path}
+        with mock.patch.dict(os.environ, environment):
+            with tracing.span("execute", weld="WeldBead"):
+                for _ in range(2):
+                    with tracing.span("discretize") as counts:
+                        counts["points"] = 10
+            # spans outside of a trace are not recorded
+            with tracing.span("orphan"):
+                pass
+        tracing._trace_file.flush()
+        events = read_trace_file(self.path)
+        self.assertEqual([x["name"] for x in events], ["discretize"] * 2 + ["execute"])
+        self.assertEqual(events[0]["args"], {"weld": "WeldBead", "points": 10})
+        self.assertTrue(all(x["ph"] == "X" for x in events))
+        self.assertLessEqual(events[2]["ts"], events[0]["ts"])
+
+    def test_given_settings(self):
+        # traces in worker threads are given settings read on the GUI thread,
+        # and mustn't read preferences themselves
+        settings = tracing.TraceSettings(True, self.path)
+        with mock.patch.object(tracing, "is_enabled", side_effect=AssertionError):
+            with tracing.span("compute_vertices", weld="WeldBead", settings=settings):
+                with tracing.span("discretize"):
+                    pass
+        tracing._trace_file.flush()
+        events = read_trace_file(self.path)
+        self.assertEqual(
+            [x["name"] for x in events], ["discretize", "compute_vertices"]
+        )
+
+    def test_trace_file_changes(self):
+        other_path = os.path.join(self.directory.name, "other.json")
+        for path in (self.path, other_path):
+            settings = tracing.TraceSettings(True, path)
+            with tracing.span("execute", weld="WeldBead", settings=settings):
+                pass
+        # the first file is closed when traces move to the other one
+        self.assertEqual(len(read_trace_file(self.path)), 1)
+        tracing.close_trace_file()
+        self.assertEqual(len(read_trace_file(other_path)), 1)
+
+    def test_traced_decorator(self):
+        @tracing.traced("double")
+        def double(x):
+            return 2 * x
+
+        self.assertEqual(double(2), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
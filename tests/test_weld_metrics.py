@@ -0,0 +1,77 @@
+from freecad.weldfeature import weld_metrics
+import unittest
+
+
+class TestStitchCount(unittest.TestCase):
+    def test_matches_stitch_placement(self):
+        # stitches are placed the same way as in geom_utils.discretize_intermittent
+        for path_length, stitch, pitch, offset in [
+            (100.0, 15.0, 50.0, 0.0),
+            (100.0, 15.0, 50.0, 5.0),
+            (115.0, 15.0, 50.0, 0.0),
+            (115.1, 15.0, 50.0, 0.0),
+            (10.0, 15.0, 50.0, 0.0),
+            (1000.0, 10.0, 30.0, 12.5),
+        ]:
+            expected = 0
+            position = offset
+            while position + stitch < path_length:
+                expected += 1
+                position += pitch
+            self.assertEqual(
+                weld_metrics.stitch_count(path_length, stitch, pitch, offset),
+                expected,
+            )
+
+    def test_welded_length(self):
+        self.assertEqual(weld_metrics.welded_length(123.4), 123.4)
+        self.assertEqual(weld_metrics.welded_length(100.0, (15.0, 50.0, 0.0)), 30.0)
+        self.assertEqual(
+            weld_metrics.welded_length(100.0, (15.0, 50.0, 0.0, "Both Ends")), 45.0
+        )
+
+
+class TestStitchIntervals(unittest.TestCase):
+    def test_offset(self):
+        intervals = weld_metrics.stitch_intervals(100.0, 15.0, 50.0, 5.0)
+        self.assertEqual(intervals.tolist(), [[5.0, 20.0], [55.0, 70.0]])
+        self.assertEqual(
+            weld_metrics.stitch_intervals(10.0, 15.0, 50.0, 0.0).shape, (0, 2)
+        )
+
+    def test_centered(self):
+        intervals = weld_metrics.stitch_intervals(100.0, 15.0, 50.0, 5.0, "Centered")
+        self.assertEqual(intervals.tolist(), [[17.5, 32.5], [67.5, 82.5]])
+
+    def test_both_ends(self):
+        intervals = weld_metrics.stitch_intervals(100.0, 15.0, 50.0, 5.0, "Both Ends")
+        self.assertEqual(intervals.tolist(), [[0.0, 15.0], [42.5, 57.5], [85.0, 100.0]])
+
+    def test_short_path(self):
+        # a path shorter than a stitch is welded along its whole length
+        for layout in ["Centered", "Both Ends"]:
+            intervals = weld_metrics.stitch_intervals(10.0, 15.0, 50.0, 0.0, layout)
+            self.assertEqual(intervals.tolist(), [[0.0, 10.0]])
+
+    def test_unknown_layout(self):
+        with self.assertRaises(ValueError):
+            weld_metrics.stitch_intervals(100.0, 15.0, 50.0, 0.0, "Random")
+
+
+class TestWeldMetrics(unittest.TestCase):
+    def test_metrics(self):
+        # 1 m of a 4 mm fillet in steel, deposited at 2 kg/h
+        density = 7850e-9
+        metrics = weld_metrics.weld_metrics(1000.0, 4.0, density, 2.0 / 3600.0)
+        self.assertAlmostEqual(metrics.area, 8.0)
+        self.assertAlmostEqual(metrics.volume, 8000.0)
+        self.assertAlmostEqual(metrics.mass, 8000.0 * density)
+        self.assertAlmostEqual(metrics.arc_time, 8000.0 * density * 1800.0)
+
+    def test_no_deposition_rate(self):
+        metrics = weld_metrics.weld_metrics(10.0, 4.0, 7850e-9, 0.0)
+        self.assertEqual(metrics.arc_time, 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+from freecad import app as FreeCAD
+import csv
+import io
+import json
+from freecad.weldfeature import weld_report
+from freecad.weldfeature.weldfeature import WeldFeature
+import unittest
+
+
+class TestWeldReport(unittest.TestCase):
+    def setUp(self):
+        self.doc = FreeCAD.newDocument("TestWeldReport")
+        for index in range(3):
+            obj = self.doc.addObject("App::FeaturePython", "WeldBead")
+            WeldFeature(obj)
+            obj.FieldWeld = index == 1
+        # other objects are skipped
+        self.doc.addObject("Part::Box", "Box")
+
+    def tearDown(self):
+        FreeCAD.closeDocument(self.doc.Name)
+
+    def test_rows(self):
+        rows = list(weld_report.iter_weld_rows(self.doc))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual([x["field_weld"] for x in rows], [False, True, False])
+        self.assertEqual(rows[0]["weld_size"], 4.0)
+        self.assertEqual(list(rows[0]), weld_report.REPORT_COLUMNS)
+
+    def test_rows_dont_touch_welds(self):
+        self.doc.recompute()
+        list(weld_report.iter_weld_rows(self.doc))
+        self.assertFalse(self.doc.WeldBead.isTouched())
+
+    def test_csv(self):
+        stream = io.StringIO()
+        count = weld_report.write_csv(weld_report.iter_weld_rows(self.doc), stream)
+        self.assertEqual(count, 3)
+        rows = list(csv.DictReader(io.StringIO(stream.getvalue())))
+        self.assertEqual(
+            [x["name"] for x in rows], ["WeldBead", "WeldBead001", "WeldBead002"]
+        )
+
+    def test_json(self):
+        stream = io.StringIO()
+        count = weld_report.write_json(weld_report.iter_weld_rows(self.doc), stream)
+        self.assertEqual(count, 3)
+        self.assertEqual(len(json.loads(stream.getvalue())), 3)
+
+    def test_empty_json(self):
+        stream = io.StringIO()
+        weld_report.write_json(iter([]), stream)
+        self.assertEqual(json.loads(stream.getvalue()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+from freecad import app as FreeCAD
+import Part
+from freecad.weldfeature import weldfeature
+from freecad.weldfeature.weldfeature import WeldFeature
+import math
+import unittest
+import numpy
+
+
+def make_arc(middle_y):
+    return Part.Arc(
+        FreeCAD.Vector(-10, 0, 0),
+        FreeCAD.Vector(0, middle_y, 0),
+        FreeCAD.Vector(10, 0, 0),
+    ).toShape()
+
+
+class TestWeldFeature(unittest.TestCase):
+    def setUp(self):
+        self.doc = FreeCAD.newDocument("TestWeldFeature")
+        self.base = self.doc.addObject("Part::Feature", "Arc")
+        self.base.Shape = make_arc(10.0)
+        self.weld = self.doc.addObject("App::FeaturePython", "WeldBead")
+        WeldFeature(self.weld)
+        self.weld.Base = [(self.base, ["Edge1"])]
+        self.doc.recompute()
+
+    def tearDown(self):
+        FreeCAD.closeDocument(self.doc.Name)
+
+    def test_follows_base_geometry_with_fixed_ends(self):
+        # a half circle
+        self.assertAlmostEqual(self.weld.WeldLength.Value, 10.0 * math.pi, places=6)
+        # the end points of the base edge stay where they are
+        self.base.Shape = make_arc(5.0)
+        self.doc.recompute()
+        self.assertAlmostEqual(
+            self.weld.WeldLength.Value, self.base.Shape.Edges[0].Length, places=6
+        )
+
+    def test_shape_output_is_visible_to_part(self):
+        self.assertTrue(Part.getShape(self.weld).isNull())
+        self.weld.ShapeOutput = True
+        self.doc.recompute()
+        shape = Part.getShape(self.weld)
+        self.assertFalse(shape.isNull())
+        self.assertGreater(shape.Volume, 0.0)
+        # the solid is built on request, not stored with the document
+        self.assertFalse(hasattr(self.weld, "Shape"))
+
+    def test_welds_share_one_discretization_cache(self):
+        cache = weldfeature._get_group_cache()
+        hits = cache.hits
+        other = self.doc.addObject("App::FeaturePython", "WeldBead")
+        WeldFeature(other)
+        other.Base = [(self.base, ["Edge1"])]
+        self.doc.recompute()
+        self.assertEqual(cache.hits, hits + 1)
+
+    def test_cached_stitches_follow_edge_order(self):
+        base = self.doc.addObject("Part::Feature", "Lines")
+        base.Shape = Part.Compound(
+            [
+                Part.makeLine(FreeCAD.Vector(0, 0, 0), FreeCAD.Vector(10, 0, 0)),
+                Part.makeLine(FreeCAD.Vector(10, 0, 0), FreeCAD.Vector(30, 0, 0)),
+            ]
+        )
+        self.weld.IntermittentWeld = True
+        self.weld.IntermittentWeldLength = 5.0
+        self.weld.IntermittentWeldPitch = 20.0
+        for names in (["Edge1", "Edge2"], ["Edge2", "Edge1"]):
+            self.weld.Base = [(base, names)]
+            self.doc.recompute()
+            cached = self.weld.Proxy._vertices.points.copy()
+            # stitches computed from scratch start from the same end
+            weldfeature._get_group_cache().clear()
+            self.weld.touch()
+            self.doc.recompute()
+            numpy.testing.assert_allclose(self.weld.Proxy._vertices.points, cached)
+
+
+if __name__ == "__main__":
+    unittest.main()